@@ -0,0 +1,69 @@
+import timeit
+
+from core import *
+
+# show help
+if len(sys.argv) > 1 and 'help' == sys.argv[1].lower():
+    print("Times the token amount conversions the bots run every loop against the old float conversions.\n")
+    print("Example Usage:")
+    command = "python {}".format(sys.argv[0])
+    examples = ['', '--number 10000']
+    for e in examples:
+        print("{} {}".format(command, e))
+    sys.exit()
+
+# calls per timing
+number = 100000
+if "--number" in sys.argv:
+    try:
+        number = int(sys.argv[sys.argv.index("--number") + 1])
+    except (IndexError, ValueError):
+        print("Invalid number")
+        sys.exit()
+
+
+# the string and float conversions amounts used to go through
+def legacy_to_token_decimals(amount, decimals):
+    amount = str(amount)
+    if '.' in amount:
+        decimals -= len(str(amount).split('.')[1])
+    return int(str(amount).replace('.', '') + '0' * decimals)
+
+
+def legacy_token_balance(balance, decimals):
+    return float(round(balance / 10 ** decimals, 15))
+
+
+balance_wei = 1234567891234567891234
+cost, iterations, mints = 0.01, 7, 3
+benchmarks = (
+    ("to wei from float", lambda: legacy_to_token_decimals(0.0123, 18), lambda: to_token_decimals(0.0123, 18)),
+    ("to wei from int", lambda: legacy_to_token_decimals(300, 18), lambda: to_token_decimals(300, 18)),
+    ("balance from wei", lambda: legacy_token_balance(balance_wei, 18), lambda: TokenAmount(balance_wei, 18)),
+    (
+        "lots in a balance",
+        lambda: math.floor(legacy_token_balance(balance_wei, 18) / 300),
+        lambda: TokenAmount(balance_wei, 18) // 300
+    ),
+    (
+        "required vs balance",
+        lambda: round(cost * iterations * mints, 15) > legacy_token_balance(balance_wei, 18),
+        lambda: TokenAmount.from_units(to_decimal(cost) * iterations * mints, 18) > TokenAmount(balance_wei, 18)
+    ),
+    ("format for logging", lambda: "{:.15f}".format(legacy_token_balance(balance_wei, 18)), lambda: "{:.15f}".format(TokenAmount(balance_wei, 18))),
+)
+
+print("{:<22} {:>12} {:>12}".format("conversion", "legacy ns", "wei ns"))
+for label, legacy, current in benchmarks:
+    legacy_ns = min(timeit.repeat(legacy, number=number, repeat=3)) / number * 10 ** 9
+    current_ns = min(timeit.repeat(current, number=number, repeat=3)) / number * 10 ** 9
+    print("{:<22} {:>12.1f} {:>12.1f}".format(label, legacy_ns, current_ns))
+
+# the exactness the float path gave up
+print()
+exact_balance = 435 * 10 ** 16
+print("Need more tokens for 435 x 0.01 with floats: {}".format(round(0.01 * 435, 15) > legacy_token_balance(exact_balance, 18)))
+print("Need more tokens for 435 x 0.01 in wei: {}".format(TokenAmount.from_units(to_decimal(0.01) * 435, 18) > TokenAmount(exact_balance, 18)))
+print("1.2345678 to 6 decimals (legacy): {}".format(legacy_to_token_decimals(1.2345678, 6)))
+print("1.2345678 to 6 decimals: {}".format(to_token_decimals(1.2345678, 6)))
+print("1e-05 to wei: {}".format(to_token_decimals(1e-05, 18)))
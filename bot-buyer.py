@@ -1,154 +1,115 @@
 from core import *
 
-# set config variables
-buy_percent_diff_pdai = 20
-buy_percent_diff_pusdc = 30
-buy_with_amount_pls = 30000
-slippage_percent = 5
+# set config variables, the watched tokens, thresholds and buy amount are in data/strategies.json
 wallet_a_min_pls = 20000
 wallet_b_min_pls = 100000
 wallet_c_min_pls = 20000
 loop_delay = 3
-rapid_gas_fee_limit = 650000
+loop_delay_ceiling = 60
 
 # load wallet A and set address for logging
 set_logging(wallet_a_address, 'INFO')
+start_rpc_keepalive()
+set_ledger_strategy('buyer')
 account = load_wallet(wallet_a_address, os.getenv('SECRET'))
 
-# load contract addresses
-pdai_address = '0x6B175474E89094C44Da98b954EedeAC495271d0F'
-pusdc_address = '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48'
-affection_address = '0x24F0154C1dCe548AdF15da2098Fdd8B8A3B8151D'
-wpls_address = '0xA1077a294dDE1B09bB078844df40758a5D0f9a27'
+# fetch any missing abis up front so the loop never waits on blockscout
+prefetch_contract_abis()
+
+# load the tokens to watch and buy
+strategy = load_strategy('buyer')
+quote, reference = strategy['quote'], strategy['reference']
+sampled_addresses = [reference['address'], *strategy['tokens']]
+
+# keep the sampled pairs' reserves in memory so price samples don't cost rpc calls
+if pool_indexer_enabled:
+    start_pool_indexer(strategy['router'], [(token_address, quote['address']) for token_address in sampled_addresses])
 
 while True:
     # log the wallet's pls balance
     pls_balance_a = get_pls_balance(account.address)
     logging.info("PLS Balance: {:.15f}".format(pls_balance_a))
 
-    # check if wallet b has a minimum amount of pls and send some back for minting
-    pls_balance_b = get_pls_balance(wallet_b_address)
-    if pls_balance_b - wallet_b_min_pls < 0:
-        send_to_wallet_b = math.ceil(wallet_b_min_pls - pls_balance_b)
-        logging.info("Minter needs {} PLS".format(send_to_wallet_b))
-        # check if sending pls to wallet b leaves wallet a with enough left over
-        if send_to_wallet_b < (pls_balance_a - wallet_a_min_pls):
-            if send_pls(account, wallet_b_address, send_to_wallet_b):
-                logging.info("Sent {} PLS to {}".format(send_to_wallet_b, wallet_b_address))
+    # check if wallets b and c have a minimum amount of pls and send some back for minting and selling
+    top_ups = {}
+    pls_available_a = pls_balance_a - wallet_a_min_pls
+    for wallet_label, wallet_address, wallet_min_pls in (
+            ('Minter', wallet_b_address, wallet_b_min_pls),
+            ('Seller', wallet_c_address, wallet_c_min_pls)
+    ):
+        pls_balance = get_pls_balance(wallet_address)
+        if pls_balance - wallet_min_pls < 0:
+            send_amount = math.ceil(wallet_min_pls - pls_balance)
+            logging.info("{} needs {} PLS".format(wallet_label, send_amount))
+            # check if sending pls leaves wallet a with enough left over
+            if send_amount < pls_available_a:
+                top_ups[wallet_address] = send_amount
+                pls_available_a -= send_amount
             else:
-                logging.warning("Failed to send {} PLS to {}".format(send_to_wallet_b, wallet_b_address))
-        else:
-            logging.info("Not enough PLS to send right now")
-
-    # check if wallet c has a minimum amount of pls and send some back for selling
-    pls_balance_c = get_pls_balance(wallet_c_address)
-    if pls_balance_c - wallet_c_min_pls < 0:
-        send_to_wallet_c = math.ceil(wallet_c_min_pls - pls_balance_c)
-        logging.info("Seller needs {} PLS".format(send_to_wallet_c))
-        # check if sending pls to wallet c leaves wallet a with enough left over
-        if send_to_wallet_c < (pls_balance_a - wallet_a_min_pls):
-            if send_pls(account, wallet_c_address, send_to_wallet_c):
-                logging.info("Sent {} PLS to {}".format(send_to_wallet_c, wallet_c_address))
+                logging.info("Not enough PLS to send right now")
+
+    # send the top ups together in one batch
+    if top_ups:
+        for wallet_address, sent in send_pls_multi(account, top_ups).items():
+            if sent:
+                logging.info("Sent {} PLS to {}".format(top_ups[wallet_address], wallet_address))
             else:
-                logging.warning("Failed to send {} PLS to {}".format(send_to_wallet_c, wallet_c_address))
-        else:
-            logging.info("Not enough PLS to send right now")
+                logging.warning("Failed to send {} PLS to {}".format(top_ups[wallet_address], wallet_address))
 
     # check the current gas price
-    if get_mempool_gas_prices('rapid', gas_cache_seconds) > rapid_gas_fee_limit:
+    if get_mempool_gas_prices('rapid', gas_cache_seconds) > get_gas_fee_limit('swap'):
         logging.warning("Gas fees are too high")
         log_end_loop(loop_delay)
         continue
 
-    # take samples of 1 pdai/pusdc/affection to wpls price
-    pdai_sample_result = sample_exchange_rate('PulseX_v2', pdai_address, wpls_address)
-    pusdc_sample_result = sample_exchange_rate('PulseX_v2', pusdc_address, wpls_address)
-    affection_sample_result = sample_exchange_rate('PulseX_v2', affection_address, wpls_address)
-    if not pdai_sample_result or not pusdc_sample_result or not affection_sample_result:
+    # trace this round of buying from the price samples to the swaps landing
+    start_trade_trace('buy')
+
+    # take samples of 1 of every watched token and the reference to the quote token in one batch
+    rates = sample_exchange_rates(strategy['router'], sampled_addresses, quote['address'])
+    if not (signals := evaluate_strategy(strategy, rates)):
         logging.warning("Failed to sample prices")
         log_end_loop(loop_delay)
         continue
 
-    # log the current rate
-    logging.info("pDAI Rate: 1 = {} PLS".format(pdai_sample_result / 10 ** 18))
-    logging.info("pUSDC Rate: 1 = {} PLS".format(pusdc_sample_result / 10 ** 18))
-    logging.info("AFFECTION™ Rate: 1 = {} PLS".format(affection_sample_result / 10 ** 18))
+    # log the current rates
+    log_strategy_rates(strategy, signals, rates[reference['address']])
+
+    # poll faster as the rates near the buy thresholds and back off while they sit far away
+    delay = get_adaptive_delay({signal['label']: signal['gap'] for signal in signals}, loop_delay, loop_delay_ceiling)
 
     # keep a minimum pls balance in the bot
     skip = False
     if (pls_balance := get_pls_balance(wallet_a_address)) < wallet_a_min_pls:
         logging.warning("PLS balance is below minimum")
         skip = True
-    elif pls_balance < buy_with_amount_pls + wallet_a_min_pls:
+    elif pls_balance < strategy['amount'] + wallet_a_min_pls:
         logging.warning("Buying would put the PLS balance below minimum")
         skip = True
     if skip:
-        log_end_loop(loop_delay)
+        log_end_loop(delay)
         continue
 
-    # check if the pdai price is cheaper than affection price
-    if pdai_sample_result < affection_sample_result:
-        percent_diff = ((pdai_sample_result - affection_sample_result) / affection_sample_result) * 100
-        # pdai price must be cheaper and over the diff threshold
-        if percent_diff < 0 and abs(percent_diff) >= buy_percent_diff_pdai:
-            logging.info("Buying pDAI...")
-            # get the estimated amounts returned for the swap
-            estimated_swap_result = estimate_swap_result(
-                'PulseX_v2',
-                wpls_address,
-                pdai_address,
-                buy_with_amount_pls
-            )
-            if estimated_swap_result:
-                # broadcast swap pls for pdai
-                if swap_tokens(
-                    account,
-                    'PulseX_v2',
-                    [wpls_address, pdai_address],
-                    estimated_swap_result,
-                    slippage_percent,
-                    wallet_b_address
-                ):
-                    logging.info("Swapped {} PLS to pDAI".format(buy_with_amount_pls))
-            else:
-                logging.warning("No estimated swap result data")
-        else:
-            logging.info("pDAI is not within range to buy yet ({}%)".format(buy_percent_diff_pdai))
-    else:
-        logging.info("pDAI is not cheaper than AFFECTION™ yet")
-
-    # check if the pusdc price is cheaper than affection price
-    if pusdc_sample_result < affection_sample_result:
-        # check the percent difference
-        percent_diff = ((pusdc_sample_result - affection_sample_result) / affection_sample_result) * 100
-        # pusdc price must be cheaper and over the diff threshold
-        if percent_diff < 0 and abs(percent_diff) >= buy_percent_diff_pusdc:
-            logging.info("Buying pUSDC...")
-            # get the estimated amounts returned for the swap
-            estimated_swap_result = estimate_swap_result(
-                'PulseX_v2',
-                wpls_address,
-                pusdc_address,
-                buy_with_amount_pls
-            )
-            if estimated_swap_result:
-                # broadcast swap pls for pusdc
-                if swap_tokens(
-                    account,
-                    'PulseX_v2',
-                    [wpls_address, pusdc_address],
-                    estimated_swap_result,
-                    slippage_percent,
-                    wallet_b_address
-                ):
-                    logging.info("Swapped {} PLS to pUSDC".format(buy_with_amount_pls))
-            else:
-                logging.warning("No estimated swap result data")
-        else:
-            logging.info("pUSDC is not within range to buy yet ({}%)".format(buy_percent_diff_pusdc))
-    else:
-        logging.info("pUSDC is not cheaper than AFFECTION™ yet")
+    # log why the other tokens are skipped
+    for signal in signals:
+        if not signal['cheaper']:
+            logging.info("{} is not cheaper than {} yet".format(signal['label'], reference['label']))
+        elif not signal['triggered']:
+            logging.info("{} is not within range to buy yet ({}%)".format(
+                signal['label'],
+                strategy['tokens'][signal['address']]['percent_diff']
+            ))
 
-    # wait before next loop
-    log_end_loop(loop_delay)
+    # buy the tokens that are cheaper than the reference by their threshold
+    for token0_address, token1_address, label in get_strategy_swaps(strategy, signals):
+        if pls_balance < strategy['amount'] + wallet_a_min_pls:
+            logging.warning("Buying would put the PLS balance below minimum")
+            break
+        logging.info("Buying {}...".format(label))
+        if swap_with_strategy(account, strategy, token0_address, token1_address, strategy['amount']):
+            logging.info("Swapped {} {} to {}".format(strategy['amount'], quote['label'], label))
+            pls_balance -= strategy['amount']
 
+    # wait before next loop
+    end_trade_trace()
+    log_end_loop(delay)
@@ -3,12 +3,17 @@ from core import *
 # set config variables
 wallet_min_pls = 20000
 loop_delay = 3
-rapid_gas_fee_limit = 450000
+loop_delay_ceiling = 60
 
 # load wallet B and set address for logging
 set_logging(wallet_b_address, 'INFO')
+start_rpc_keepalive()
+set_ledger_strategy('minter')
 account = load_wallet(wallet_b_address, os.getenv('SECRET'))
 
+# fetch any missing abis up front so the loop never waits on blockscout
+prefetch_contract_abis()
+
 # load affection contract/info
 affection_address = '0x24F0154C1dCe548AdF15da2098Fdd8B8A3B8151D'
 affection_info = get_token_info(affection_address)
@@ -45,77 +50,70 @@ multi_math_1_1_address = '0x1322Dab9eE385Bb3D81f75EBb8356015B0872e53'
 multi_g5_address = '0xa4c61D20945c11855E7A390153fd29ceC9C7349b'
 multi_pi_address = '0xcCDaCEF154704c604365dB9E3b1DF356B9c4B6E2'
 
+# conversions queued each loop, in the order they feed each other
+conversions = (
+    ('PI', 'AFFECTION™', multi_affection_address, pi_address, affection_address, 0.01),
+    ('G5', 'AFFECTION™', multi_affection_address, g5_address, affection_address, 0.6),
+    ('MATH v1.1', 'AFFECTION™', multi_affection_address, math11_address, affection_address, 3),
+    ('pDAI', 'PI', multi_pi_address, pdai_address, pi_address, 300),
+    ('pDAI', 'G5', multi_g5_address, pdai_address, g5_address, 5),
+    ('pDAI', 'MATH v1.1', multi_math_1_1_address, pdai_address, math11_address, 1),
+    ('pUSDC', 'MATH v1.1', multi_math_1_1_address, pusdc_address, math11_address, 1),
+)
+
+
+# send affection tokens to wallet C for selling, logged once the scheduler gets to it
+def send_affection(amount):
+    if sent := send_tokens(account, affection_address, wallet_c_address, amount):
+        logging.info("Sent {} AFFECTION™ to {}".format(amount, wallet_c_address))
+    return sent
+
+
 while True:
+    # set when this loop finds something to send or convert
+    worked = False
+
     # log the wallet's pls balance
     logging.info("PLS Balance: {:.15f}".format(pls_balance := get_pls_balance(account.address)))
 
-    # transfer affection
-    logging.info("AFFECTION™ Balance: {:.15f}".format(affection_balance := math.floor(get_token_balance(affection_address, wallet_b_address))))
-    if affection_balance > 1:
-        # send affection tokens to wallet C for selling
-        if send_tokens(account, affection_address, wallet_c_address, affection_balance):
-            logging.info("Sent {} AFFECTION™ to {}".format(affection_balance, wallet_c_address))
-
-    # check the current gas price
-    if get_mempool_gas_prices('rapid', gas_cache_seconds) > rapid_gas_fee_limit:
-        logging.warning("Gas fees are too high")
-        log_end_loop(loop_delay)
-        continue
-
     # keep a minimum pls balance in the bot
     if pls_balance < wallet_min_pls:
         logging.info("PLS balance is below minimum threshold")
         log_end_loop(loop_delay)
         continue
 
-    # convert pi to affection
-    logging.info("PI Balance: {:.15f}".format(pi_balance := get_token_balance(pi_address, wallet_b_address)))
-    if (loops := math.floor(pi_balance / 0.01)) != 0:
-        logging.info("Converting {} PI to AFFECTION™...".format(loops * 0.01))
-        convert_tokens_multi(account, multi_affection_address, pi_address, affection_address, loops)
-
-    # convert g5 to affection
-    logging.info("G5 Balance: {:.15f}".format(g5_balance := get_token_balance(g5_address, wallet_b_address)))
-    if (loops := math.floor(g5_balance / 0.6)) != 0:
-        logging.info("Converting {} G5 to AFFECTION™...".format(loops * 0.6))
-        convert_tokens_multi(account, multi_affection_address, g5_address, affection_address, loops)
-
-    # convert math 1.1 to affection
-    logging.info("MATH 1.1 Balance: {:.15f}".format(math11_balance := get_token_balance(math11_address, wallet_b_address)))
-    if (loops := math.floor(math11_balance / 3)) != 0:
-        logging.info("Converting {} MATH v1.1 to AFFECTION™...".format(loops * 3))
-        convert_tokens_multi(account, multi_affection_address, math11_address, affection_address, loops)
-
-    # transfer affection
+    # send affection tokens to wallet C for selling
     logging.info("AFFECTION™ Balance: {:.15f}".format(affection_balance := math.floor(get_token_balance(affection_address, wallet_b_address))))
     if affection_balance > 1:
-        # send affection tokens to wallet C for selling
-        if send_tokens(account, affection_address, wallet_c_address, affection_balance):
-            logging.info("Sent {} AFFECTION™ to {}".format(affection_balance, wallet_c_address))
-
-    # convert pdai to pi
-    logging.info("pDAI Balance: {:.15f}".format(pdai_balance := get_token_balance(pdai_address, wallet_b_address)))
-    if (loops := math.floor(pdai_balance / 300)) != 0:
-        logging.info("Converting {} pDAI to PI...".format(loops * 300))
-        convert_tokens_multi(account, multi_pi_address, pdai_address, pi_address, loops)
-
-    # convert pdai to g5
-    pdai_balance = get_token_balance(pdai_address, wallet_b_address)
-    if (loops := math.floor(pdai_balance / 5)) != 0:
-        logging.info("Converting {} pDAI to G5...".format(loops * 5))
-        convert_tokens_multi(account, multi_g5_address, pdai_address, g5_address, loops)
-
-    # convert pdai to math1.1
-    pdai_balance = get_token_balance(pdai_address, wallet_b_address)
-    if (loops := math.floor(pdai_balance)) != 0:
-        logging.info("Converting {} pDAI to MATH v1.1 ...".format(loops))
-        convert_tokens_multi(account, multi_math_1_1_address, pdai_address, math11_address, loops)
-
-    # convert pusdc to math1.1
-    logging.info("pUSDC Balance: {:.15f}".format(pusdc_balance := get_token_balance(pusdc_address, wallet_b_address)))
-    if (loops := math.floor(pusdc_balance)) != 0:
-        logging.info("Converting {} pUSDC to MATH v1.1 ...".format(loops))
-        convert_tokens_multi(account, multi_math_1_1_address, pusdc_address, math11_address, loops)
-
-    # wait before next loop
-    log_end_loop(loop_delay)
+        worked = True
+        schedule_action('send AFFECTION™', 'transfer', send_affection, affection_balance, gas=100000)
+
+    # queue conversions as low priority work, the scheduler holds them for cheap blocks instead of abandoning them
+    balances = {}
+    for label0, label1, multi_address, token0_address, token1_address, lot in conversions:
+        if token0_address not in balances:
+            logging.info("{} Balance: {:.15f}".format(label0, balances.setdefault(token0_address, get_token_balance(token0_address, wallet_b_address))))
+        if balances[token0_address] // lot != 0:
+            worked = True
+            schedule_action(
+                "convert {} to {}".format(label0, label1),
+                'mint',
+                convert_token_balance,
+                account,
+                multi_address,
+                token0_address,
+                token1_address,
+                lot,
+                # budget the block gas the last conversions measured instead of a flat default
+                gas=estimate_convert_gas(multi_address, token0_address, balances[token0_address] // lot)
+            )
+
+    # run whatever this block's gas price and budget allow
+    for key, result in run_scheduled_actions().items():
+        if result:
+            logging.info("Finished: {}".format(key))
+        elif result is False:
+            logging.warning("Failed to {}".format(key))
+
+    # wait before next loop, backing off while there's nothing to do
+    log_end_loop(get_adaptive_delay({}, loop_delay, loop_delay_ceiling, active=worked))
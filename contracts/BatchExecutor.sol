@@ -0,0 +1,98 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.19;
+
+interface IERC20 {
+    function approve(address spender, uint256 amount) external returns (bool);
+    function balanceOf(address account) external view returns (uint256);
+    function transfer(address to, uint256 amount) external returns (bool);
+}
+
+// Packs repeated calls and multi-recipient transfers for one wallet into a single transaction.
+// Each wallet deploys its own executor since it spends the owner's approvals.
+contract BatchExecutor {
+    address public immutable owner;
+
+    event CallResult(uint256 indexed index, bool success);
+
+    constructor() {
+        owner = msg.sender;
+    }
+
+    modifier onlyOwner() {
+        require(msg.sender == owner, "BatchExecutor: NOT_OWNER");
+        _;
+    }
+
+    receive() external payable {}
+
+    // pull tokenIn from the owner, call target count times with the same calldata and return what's left to the owner
+    function repeatCall(
+        address tokenIn,
+        uint256 amountIn,
+        address target,
+        bytes calldata data,
+        uint256 count,
+        address tokenOut
+    ) external onlyOwner returns (bool[] memory results) {
+        if (amountIn > 0) {
+            require(_transferFrom(tokenIn, owner, address(this), amountIn), "BatchExecutor: TRANSFER_FROM_FAILED");
+            IERC20(tokenIn).approve(target, amountIn);
+        }
+        results = new bool[](count);
+        for (uint256 i = 0; i < count; i++) {
+            (results[i], ) = target.call(data);
+            emit CallResult(i, results[i]);
+        }
+        if (amountIn > 0) {
+            IERC20(tokenIn).approve(target, 0);
+            _sweep(tokenIn);
+        }
+        _sweep(tokenOut);
+    }
+
+    // send pls to each recipient, anything that fails to send is refunded
+    function multiSend(address[] calldata recipients, uint256[] calldata amounts)
+        external payable onlyOwner returns (bool[] memory results)
+    {
+        require(recipients.length == amounts.length, "BatchExecutor: LENGTH_MISMATCH");
+        results = new bool[](recipients.length);
+        for (uint256 i = 0; i < recipients.length; i++) {
+            (results[i], ) = payable(recipients[i]).call{value: amounts[i]}("");
+            emit CallResult(i, results[i]);
+        }
+        if (address(this).balance > 0) {
+            (bool refunded, ) = payable(owner).call{value: address(this).balance}("");
+            require(refunded, "BatchExecutor: REFUND_FAILED");
+        }
+    }
+
+    // transfer tokens from the owner to each recipient
+    function multiTransfer(address token, address[] calldata recipients, uint256[] calldata amounts)
+        external onlyOwner returns (bool[] memory results)
+    {
+        require(recipients.length == amounts.length, "BatchExecutor: LENGTH_MISMATCH");
+        results = new bool[](recipients.length);
+        for (uint256 i = 0; i < recipients.length; i++) {
+            results[i] = _transferFrom(token, owner, recipients[i], amounts[i]);
+            emit CallResult(i, results[i]);
+        }
+    }
+
+    function _sweep(address token) internal {
+        if (token == address(0)) {
+            return;
+        }
+        uint256 balance = IERC20(token).balanceOf(address(this));
+        if (balance > 0) {
+            IERC20(token).transfer(owner, balance);
+        }
+    }
+
+    // tolerate tokens that don't return a bool from transferFrom
+    function _transferFrom(address token, address from, address to, uint256 amount) internal returns (bool) {
+        (bool success, bytes memory returned) = token.call(
+            abi.encodeWithSignature("transferFrom(address,address,uint256)", from, to, amount)
+        );
+        return success && (returned.length == 0 || abi.decode(returned, (bool)));
+    }
+}
@@ -3,25 +3,504 @@ import logging
 import math
 import os
 import random
+import resource
+import socket
+import sqlite3
 import sys
 import time
 import asyncio
+import functools
+import gc
+import gzip
+import threading
+import tracemalloc
+from bisect import bisect_left, insort
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Context, Decimal, MAX_PREC, ROUND_HALF_EVEN
 from json import JSONDecodeError
 from logging.handlers import TimedRotatingFileHandler
 from statistics import median, mean, mode
+from types import SimpleNamespace
+from uuid import uuid4
 
 import requests
+import websockets
 from dotenv import load_dotenv
 from requests import RequestException
-from web3 import Web3
-from web3.exceptions import BlockNotFound, Web3Exception, Web3ValidationError
+from requests.adapters import HTTPAdapter
+from ens import ENS
+from eth_account import Account
+from eth_account.hdaccount import Mnemonic
+from hexbytes import HexBytes
+from web3 import HTTPProvider, IPCProvider, Web3, WebsocketProvider
+from web3.contract import Contract
+from web3.logs import DISCARD
+from web3.providers import JSONBaseProvider
+from web3.exceptions import BlockNotFound, ContractLogicError, Web3Exception, Web3ValidationError
 from web3_multi_provider import MultiProvider
 
 load_dotenv()
 for package in ('web3', 'web3_multi_provider', 'urllib3',):
     logging.getLogger(package).setLevel(logging.ERROR)
 
-web3 = Web3(MultiProvider(json.load(open('./data/rpc_servers.json'))))
+
+# passes requests through to another provider and records them with their timings
+class RecordingProvider(JSONBaseProvider):
+    def __init__(self, provider, file_path):
+        super().__init__()
+        self.provider = provider
+        self.started = time.time()
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        self.file = gzip.open(file_path, 'at')
+
+    def make_request(self, method, params):
+        started = time.time()
+        response = self.provider.make_request(method, params)
+        entry = {
+            't': round(started - self.started, 6),
+            'd': round(time.time() - started, 6),
+            'm': method,
+            'p': params,
+            'r': response
+        }
+        with self.lock:
+            self.file.write(json.dumps(entry, default=lambda o: o.hex() if hasattr(o, 'hex') else str(o)) + "\n")
+            self.file.flush()
+        return response
+
+
+# raised when a replay is asked for a request that was never recorded
+class ReplayMismatch(Exception):
+    pass
+
+
+# serves recorded responses in order for each method and params, anything unrecorded fails instead of guessing
+class ReplayProvider(JSONBaseProvider):
+    def __init__(self, file_path, latency_scale=0.0):
+        super().__init__()
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.entries = {}
+        for line in gzip.open(file_path, 'rt'):
+            entry = json.loads(line)
+            self.entries.setdefault((entry['m'], json.dumps(entry['p'], sort_keys=True)), deque()).append(entry)
+
+    def make_request(self, method, params):
+        # params go through the same encoding the recorder wrote them with
+        key = (method, json.dumps(params, sort_keys=True, default=lambda o: o.hex() if hasattr(o, 'hex') else str(o)))
+        with self.lock:
+            entries = self.entries.get(key)
+            entry = entries.popleft() if entries else None
+        if not entry:
+            logging.error("No recorded response for {} {}".format(method, key[1]))
+            raise ReplayMismatch("No recorded response for {} {}".format(method, key[1]))
+        if self.latency_scale:
+            time.sleep(entry['d'] * self.latency_scale)
+        return entry['r']
+
+
+# one keep-alive session shared by every thread, web3 otherwise opens a session and a tls handshake per thread
+class PooledHTTPProvider(HTTPProvider):
+    def __init__(self, endpoint_uri, request_kwargs=None, session=None):
+        super().__init__(endpoint_uri, request_kwargs)
+        self.session = session or requests.Session()
+        self.throttled = None
+
+    def make_request(self, method, params):
+        response = self.session.post(
+            self.endpoint_uri,
+            data=self.encode_rpc_request(method, params),
+            **self.get_request_kwargs()
+        )
+        if response.status_code == 429 and self.throttled:
+            self.throttled()
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+
+# web3's websocket provider shares one connection, so requests from the bot's threads take turns on it
+class SerialWebsocketProvider(WebsocketProvider):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+
+    def make_request(self, method, params):
+        with self.lock:
+            return super().make_request(method, params)
+
+
+# raised for low priority requests the rate limiter sheds instead of queueing
+class RpcBudgetExhausted(Exception):
+    pass
+
+
+# token buckets per rpc endpoint kept in sqlite so every bot process spends from the same request budget
+class RateLimiter:
+    # sends and the reads deciding them come first, balance logging and gas sampling are shed first
+    method_priorities = {
+        'eth_sendRawTransaction': 'high',
+        'eth_getTransactionCount': 'high',
+        'eth_getTransactionReceipt': 'high',
+        'eth_estimateGas': 'high',
+        'eth_chainId': 'high',
+        'eth_getBalance': 'low',
+        'eth_gasPrice': 'low',
+        'eth_maxPriorityFeePerGas': 'low',
+        'eth_feeHistory': 'low',
+        'eth_getTransactionByHash': 'low',
+    }
+    # share of each bucket a priority has to leave for the ones above it
+    reserves = {'high': 0, 'normal': 0.25, 'low': 0.5}
+
+    def __init__(self, file_path):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.connection = sqlite3.connect(file_path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS buckets (endpoint TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def get_priority(self, method, params):
+        # full pending blocks are only fetched for gas sampling
+        if method == 'eth_getBlockByNumber' and params and params[0] == 'pending':
+            return 'low'
+        return self.method_priorities.get(method, 'normal')
+
+    @contextmanager
+    def bucket(self, endpoint, rate, burst):
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self.connection.execute("SELECT tokens, updated FROM buckets WHERE endpoint = ?", (endpoint,)).fetchone()
+                bucket = {'tokens': burst if row is None else min(burst, row[0] + (now - row[1]) * rate)}
+                yield bucket
+                self.connection.execute(
+                    "INSERT INTO buckets (endpoint, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(endpoint) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (endpoint, bucket['tokens'], now)
+                )
+            finally:
+                self.connection.execute("COMMIT")
+
+    def acquire(self, endpoint, rate, burst, priority):
+        # 0 once a token is taken, otherwise the seconds until this priority could take one
+        floor = burst * self.reserves[priority]
+        with self.bucket(endpoint, rate, burst) as bucket:
+            if bucket['tokens'] - 1 >= floor:
+                bucket['tokens'] -= 1
+                return 0
+            return (floor + 1 - bucket['tokens']) / rate
+
+    def drain(self, endpoint, rate, burst):
+        self.stats['throttled'] += 1
+        # a 429 empties the bucket and leaves a debt so every process backs off together
+        with self.bucket(endpoint, rate, burst) as bucket:
+            bucket['tokens'] = -burst
+
+
+# rpc endpoints from rpc_servers.json as plain urls or objects choosing the transport and its connection settings
+class TransportMultiProvider(MultiProvider):
+    def __init__(self, endpoints, rate_limiter=None, rate_limit=0, rate_burst=0):
+        super().__init__([])
+        self.keepalive_seconds, self.last_used, self.rate_limits = [], [], []
+        self.rate_limiter = rate_limiter
+        for endpoint in endpoints:
+            if isinstance(endpoint, str):
+                endpoint = {'url': endpoint}
+            url = endpoint.get('url') or endpoint.get('path')
+            transport = endpoint.get('transport') or (
+                'websocket' if url.startswith('ws') else 'http' if url.startswith('http') else 'ipc'
+            )
+            if transport == 'http':
+                # keep-alive connections reused across requests with gzip responses
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=endpoint.get('pool_size', 10))
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({'Accept-Encoding': 'gzip' if endpoint.get('gzip', True) else 'identity'})
+                provider = PooledHTTPProvider(url, {'timeout': endpoint.get('timeout', 10)}, session)
+            elif transport == 'websocket':
+                provider = SerialWebsocketProvider(url, websocket_timeout=endpoint.get('timeout', 10))
+            elif transport == 'ipc':
+                provider = IPCProvider(url.removeprefix('ipc://'), endpoint.get('timeout', 10))
+            else:
+                raise Exception("Unknown rpc transport {}".format(transport))
+            # requests per second and burst size the endpoint allows, 0 leaves it unlimited
+            rate = endpoint.get('rate_limit', rate_limit)
+            limits = (rate, endpoint.get('burst', rate_burst if rate == rate_limit and rate_burst else rate * 2))
+            # only the http transport sees status codes, websocket and ipc endpoints get no 429 feedback and rely on their budget alone
+            if rate_limiter and rate and transport == 'http':
+                provider.throttled = functools.partial(rate_limiter.drain, url, *limits)
+            self._hosts_uri.append(url)
+            self._providers.append(provider)
+            self.keepalive_seconds.append(endpoint.get('keepalive', 0))
+            self.last_used.append(0)
+            self.rate_limits.append(limits)
+        self.endpoint_uri = self._hosts_uri[0]
+
+    def make_request(self, method, params):
+        index = self.throttle(method, params) if self.rate_limiter else self._current_provider_index
+        self.last_used[index] = time.time()
+        # a read moved to another endpoint goes there on its own, the current endpoint stays put for sends and nonces
+        if index != self._current_provider_index:
+            try:
+                response = self._providers[index].make_request(method, params)
+            except Exception as e:
+                logging.debug(e)
+            else:
+                self._sanitize_poa_response(method, response)
+                return response
+        return super().make_request(method, params)
+
+    def throttle(self, method, params):
+        priority = self.rate_limiter.get_priority(method, params)
+        while True:
+            index = self._current_provider_index
+            rate, burst = self.rate_limits[index]
+            if not rate or not (wait := self.rate_limiter.acquire(self._hosts_uri[index], rate, burst, priority)):
+                return index
+            # sends stay on their endpoint for consistent nonces, reads can use any endpoint with budget left
+            if priority != 'high':
+                for other in range(len(self._providers)):
+                    rate, burst = self.rate_limits[other]
+                    if other != index and rate and not self.rate_limiter.acquire(self._hosts_uri[other], rate, burst, priority):
+                        self.rate_limiter.stats['moved'] += 1
+                        return other
+            if priority == 'low':
+                self.rate_limiter.stats['shed'] += 1
+                raise RpcBudgetExhausted("RPC request budget exhausted, shed {}".format(method))
+            self.rate_limiter.stats['waited'] += 1
+            time.sleep(min(wait, 1))
+
+    def ping(self, index):
+        rate, burst = self.rate_limits[index]
+        # keepalive pings are expendable, skip them rather than spend budget the bots need
+        if self.rate_limiter and rate and self.rate_limiter.acquire(self._hosts_uri[index], rate, burst, 'low'):
+            return
+        try:
+            self._providers[index].make_request('eth_chainId', [])
+        except Exception as e:
+            logging.debug(e)
+        self.last_used[index] = time.time()
+
+    def keep_warm(self):
+        # open every connection up front, then ping the idle endpoints that asked for keepalive
+        with ThreadPoolExecutor(max_workers=len(self._providers)) as executor:
+            list(executor.map(self.ping, range(len(self._providers))))
+        if not (intervals := [seconds for seconds in self.keepalive_seconds if seconds]):
+            return
+        while True:
+            time.sleep(min(intervals))
+            for index, seconds in enumerate(self.keepalive_seconds):
+                if seconds and time.time() - self.last_used[index] >= seconds:
+                    self.ping(index)
+
+
+# serves repeated eth_call and eth_getBalance reads from memory until a new block or one of our transactions confirms
+class BlockCacheProvider(JSONBaseProvider):
+    cached_methods = ('eth_call', 'eth_getBalance')
+
+    def __init__(self, provider, block_check_seconds=1.0):
+        super().__init__()
+        self.provider = provider
+        self.block_check_seconds = block_check_seconds
+        self.lock = threading.Lock()
+        self.block, self.checked = None, 0
+        self.responses = {}
+        self.stats = Counter()
+
+    def invalidate(self):
+        with self.lock:
+            self.responses.clear()
+            self.stats['invalidations'] += 1
+
+    def observe_block(self, response):
+        if 'result' not in response:
+            return
+        block = int(response['result'], 16) if isinstance(response['result'], str) else response['result']
+        with self.lock:
+            self.checked = time.time()
+            if block != self.block:
+                self.block = block
+                self.responses.clear()
+
+    def make_request(self, method, params):
+        if method not in self.cached_methods or (params[1] if len(params) > 1 else 'latest') == 'pending':
+            response = self.provider.make_request(method, params)
+            if method == 'eth_blockNumber':
+                self.observe_block(response)
+            elif method == 'eth_getTransactionReceipt' and response.get('result'):
+                # our own transaction changed balances and contract state
+                self.invalidate()
+            return response
+        # look for a new block at most every block_check_seconds
+        if time.time() - self.checked >= self.block_check_seconds:
+            self.stats['block_checks'] += 1
+            self.observe_block(self.provider.make_request('eth_blockNumber', []))
+        key = (method, json.dumps(params, sort_keys=True, default=lambda o: o.hex() if hasattr(o, 'hex') else str(o)))
+        with self.lock:
+            if (response := self.responses.get(key)) is not None:
+                self.stats["{}_hits".format(method)] += 1
+                return response
+            self.stats["{}_misses".format(method)] += 1
+            block = self.block
+        response = self.provider.make_request(method, params)
+        if 'error' not in response:
+            with self.lock:
+                # a read that raced a new block belongs to neither
+                if block == self.block:
+                    self.responses[key] = response
+        return response
+
+
+# exact context for shifting amounts between units and wei, shifts never need rounding
+wei_context = Context(prec=MAX_PREC)
+
+
+# token amounts kept as integer wei with the token's decimals, only turned into units when compared or formatted
+class TokenAmount:
+    __slots__ = ('wei', 'decimals')
+
+    def __init__(self, wei, decimals=18):
+        self.wei = int(wei)
+        self.decimals = decimals
+
+    @classmethod
+    def from_units(cls, amount, decimals=18):
+        return cls(units_to_wei(amount, decimals), decimals)
+
+    @property
+    def units(self):
+        return wei_context.scaleb(Decimal(self.wei), -self.decimals)
+
+    def _wei_of(self, other):
+        if isinstance(other, TokenAmount):
+            return other.wei if other.decimals == self.decimals else units_to_wei(other, self.decimals)
+        return units_to_wei(other, self.decimals)
+
+    def __eq__(self, other):
+        try:
+            return self.wei == self._wei_of(other)
+        except (TypeError, ValueError, ArithmeticError):
+            return NotImplemented
+
+    def __lt__(self, other):
+        return self.wei < self._wei_of(other)
+
+    def __le__(self, other):
+        return self.wei <= self._wei_of(other)
+
+    def __gt__(self, other):
+        return self.wei > self._wei_of(other)
+
+    def __ge__(self, other):
+        return self.wei >= self._wei_of(other)
+
+    def __hash__(self):
+        return hash(self.units)
+
+    def __add__(self, other):
+        return TokenAmount(self.wei + self._wei_of(other), self.decimals)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return TokenAmount(self.wei - self._wei_of(other), self.decimals)
+
+    def __rsub__(self, other):
+        return TokenAmount(self._wei_of(other) - self.wei, self.decimals)
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return TokenAmount(self.wei * other, self.decimals)
+        numerator, denominator = to_decimal(other).as_integer_ratio()
+        return TokenAmount(self.wei * numerator // denominator, self.decimals)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        # dividing two amounts gives a ratio, dividing by a number gives an amount
+        if isinstance(other, TokenAmount):
+            return Decimal(self.wei) / Decimal(self._wei_of(other))
+        numerator, denominator = to_decimal(other).as_integer_ratio()
+        return TokenAmount(self.wei * denominator // numerator, self.decimals)
+
+    def __floordiv__(self, other):
+        # how many whole times the other amount fits
+        return self.wei // self._wei_of(other)
+
+    def __neg__(self):
+        return TokenAmount(-self.wei, self.decimals)
+
+    def __abs__(self):
+        return TokenAmount(abs(self.wei), self.decimals)
+
+    def __bool__(self):
+        return self.wei != 0
+
+    def __int__(self):
+        return int(self.units)
+
+    def __float__(self):
+        return self.wei / 10 ** self.decimals
+
+    def __floor__(self):
+        return self.wei // 10 ** self.decimals
+
+    def __ceil__(self):
+        return -(-self.wei // 10 ** self.decimals)
+
+    def __round__(self, ndigits=None):
+        if ndigits is None:
+            return int(self.units.to_integral_value(ROUND_HALF_EVEN))
+        return TokenAmount.from_units(round(self.units, ndigits), self.decimals)
+
+    def __format__(self, format_spec):
+        return format(self.units, format_spec) if format_spec else str(self)
+
+    def __str__(self):
+        units = format(self.units, 'f')
+        return units.rstrip('0').rstrip('.') if '.' in units else units
+
+    def __repr__(self):
+        return "TokenAmount({}, {})".format(self.wei, self.decimals)
+
+
+def load_rpc_provider():
+    if os.getenv('RPC_CACHE', 'true').lower() in ('1', 'true', 'yes'):
+        return BlockCacheProvider(load_rpc_transport(), int(os.getenv('RPC_CACHE_BLOCK_CHECK_MS', 1000)) / 1000)
+    return load_rpc_transport()
+
+
+def load_rpc_transport():
+    if replay_file := os.getenv('RPC_REPLAY'):
+        return ReplayProvider(replay_file, float(os.getenv('RPC_REPLAY_LATENCY_SCALE', 0)))
+    global rpc_rate_limiter
+    endpoints = json.load(open('./data/rpc_servers.json'))
+    rate_limit = float(os.getenv('RPC_RATE_LIMIT', 0))
+    # limits set on endpoints in rpc_servers.json apply even when RPC_RATE_LIMIT turns the default off
+    if rate_limit or any(isinstance(endpoint, dict) and endpoint.get('rate_limit') for endpoint in endpoints):
+        rpc_rate_limiter = RateLimiter('./data/cache/rpc_budget.db')
+    provider = TransportMultiProvider(
+        endpoints,
+        rpc_rate_limiter,
+        rate_limit,
+        float(os.getenv('RPC_RATE_BURST', rate_limit * 2))
+    )
+    if record_file := os.getenv('RPC_RECORD'):
+        return RecordingProvider(provider, record_file)
+    return provider
+
+
+rpc_rate_limiter = None
+web3 = Web3(load_rpc_provider())
+# build ens once, web3 otherwise builds a new one for every contract it constructs
+web3.ens = ENS.from_web3(web3)
 
 gas_multiplier = float(os.getenv('GAS_MULTIPLIER'))
 rapid_gas_fee_limit = int(os.getenv('GAS_FEE_RAPID_LIMIT'))
@@ -30,6 +509,182 @@ wallet_a_address = os.getenv('WALLET_A_ADDRESS')
 wallet_b_address = os.getenv('WALLET_B_ADDRESS')
 wallet_c_address = os.getenv('WALLET_C_ADDRESS')
 
+# routers and intermediate tokens considered when looking for the best swap execution
+best_execution_routers = ('PulseX_v1', 'PulseX_v2',)
+best_execution_intermediates = (
+    '0xA1077a294dDE1B09bB078844df40758a5D0f9a27',  # WPLS
+    '0x6B175474E89094C44Da98b954EedeAC495271d0F',  # pDAI
+    '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48',  # pUSDC
+)
+swap_gas_base = 120000
+swap_gas_per_hop = 70000
+
+# pair reserves kept in memory from sync events, with recent checkpoints to roll back to on reorgs
+pool_indexer_enabled = os.getenv('POOL_INDEXER', '').lower() in ('1', 'true', 'yes')
+pool_state = {'block': None, 'block_hash': None, 'pairs': {}, 'checkpoints': []}
+pool_state_lock = threading.Lock()
+pool_indexer_thread = None
+pool_checkpoint_count = 64
+pool_state_file = './data/cache/pool_state.json'
+router_fee_percents = {'PulseX_v1': 0.29, 'PulseX_v2': 0.29}
+sync_event_topic = Web3.keccak(text='Sync(uint112,uint112)').hex()
+swap_event_topic = Web3.keccak(text='Swap(address,uint256,uint256,uint256,uint256,address)').hex()
+
+# replacement fee ladder used when a broadcast tx isn't included
+fee_ladder_steps = int(os.getenv('FEE_LADDER_STEPS', 5))
+fee_ladder_multiplier = float(os.getenv('FEE_LADDER_MULTIPLIER', 1.125))
+fee_ladder_blocks = int(os.getenv('FEE_LADDER_BLOCKS', 2))
+fee_ladder_poll_seconds = 2
+
+mint_gas_lock = threading.Lock()
+
+# read from the node once so the same code signs for pulsechain, testnets and local chains
+chain_id = None
+
+# most calls packed into a single batch executor transaction
+batch_max_calls = 300
+
+# fee ceilings and block gas shares per priority class, swaps are never held back by the budget and minting waits for cheap blocks
+gas_budget_file = './data/gas_budget.db'
+gas_budget_per_block = int(os.getenv('GAS_BUDGET_PER_BLOCK', 10000000))
+gas_priority_classes = {
+    'swap': {'rank': 0, 'fee_limit': int(os.getenv('GAS_FEE_URGENT_LIMIT', rapid_gas_fee_limit)), 'budget_share': None},
+    'transfer': {'rank': 1, 'fee_limit': rapid_gas_fee_limit, 'budget_share': 1.0},
+    'mint': {'rank': 2, 'fee_limit': int(os.getenv('GAS_FEE_CHEAP_LIMIT', 450000)), 'budget_share': 0.5, 'deferrable': True},
+}
+scheduled_actions = {}
+scheduler_lock = threading.Lock()
+scheduler_default_gas = 1000000
+scheduler_deadline_seconds = 3600
+scheduler_escalate_seconds = 300
+
+# base fee forecast from recent fee history, deferrable work waits for a predicted drop
+gas_forecast_blocks = int(os.getenv('GAS_FORECAST_BLOCKS', 10))
+gas_forecast_history_blocks = 64
+gas_forecast_min_savings_percent = float(os.getenv('GAS_FORECAST_MIN_SAVINGS_PERCENT', 5))
+gas_forecast_decay = 0.7
+fee_history_state = {'block': None, 'history': None}
+
+# local ledger of every transaction core broadcasts
+ledger_file = './data/ledger.db'
+ledger_strategy = None
+ledger_connection = None
+ledger_lock = threading.Lock()
+transfer_event_topic = Web3.keccak(text='Transfer(address,address,uint256)').hex()
+withdrawal_event_topic = Web3.keccak(text='Withdrawal(address,uint256)').hex()
+
+# sampling profiler over the bot loop iterations, off unless PROFILE is set
+profile_enabled = os.getenv('PROFILE', '').lower() in ('1', 'true', 'yes')
+profile_interval_seconds = int(os.getenv('PROFILE_INTERVAL_MS', 10)) / 1000
+profile_report_seconds = int(os.getenv('PROFILE_REPORT_SECONDS', 60))
+profile_samples = Counter()
+profile_state = {'name': None, 'paused': False, 'iterations': 0, 'reported': 0}
+profiler_thread = None
+
+# tracemalloc snapshots diffed between reports to find allocation sites that keep growing, off unless MEMORY_PROFILE is set
+memory_profile_enabled = os.getenv('MEMORY_PROFILE', '').lower() in ('1', 'true', 'yes')
+memory_profile_seconds = int(os.getenv('MEMORY_PROFILE_SECONDS', 300))
+memory_profile_frames = int(os.getenv('MEMORY_PROFILE_FRAMES', 8))
+memory_growth_reports = 3
+memory_profile_state = {'name': None, 'reported': 0, 'rss': None, 'sites': None, 'growth': Counter()}
+
+# per trade latency traces from price sample to inclusion, off unless TRADE_TRACE is set
+trade_trace_enabled = os.getenv('TRADE_TRACE', '').lower() in ('1', 'true', 'yes')
+trade_trace_file = './data/logs/trades.jsonl'
+trade_trace_local = threading.local()
+
+# hd worker wallets derived from one encrypted seed, decrypted once per process
+hd_wallet_folder = './data/wallets/hd'
+hd_wallet_path = "m/44'/60'/0'/0"
+hd_wallet_state = {'mnemonic': None, 'accounts': {}}
+hd_wallet_lock = threading.Lock()
+# eth-account keeps mnemonic derivation behind an opt in
+Account.enable_unaudited_hdwallet_features()
+
+# local agent holding decrypted keys, used for signing when set
+signing_agent_socket = os.getenv('SIGNING_AGENT_SOCKET')
+
+# loop delays back off while prices sit far from the thresholds and drop to the floor near them
+adaptive_delay_state = {}
+adaptive_delay_horizon = 3
+
+# multicall3 is deployed at the same address on every chain
+multicall_address = '0xcA11bde05977b3631167028862bE2a173976CA11'
+multicall_chunk_size = 500
+balance_of_selector = Web3.keccak(text='balanceOf(address)')[:4]
+get_eth_balance_selector = Web3.keccak(text='getEthBalance(address)')[:4]
+get_reserves_selector = Web3.keccak(text='getReserves()')[:4]
+
+# log price graph over every pool between known tokens plus the fixed cost mint routes
+arbitrage_min_profit_percent = float(os.getenv('ARBITRAGE_MIN_PROFIT_PERCENT', 0.5))
+
+# abis are fetched ahead of time by prefetch-abis.py and loaded once per process
+blockscout_api_url = os.getenv('BLOCKSCOUT_API_URL', 'https://api.scan.pulsechain.com/api/v2').rstrip('/')
+blockscout_session = requests.Session()
+blockscout_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+blockscout_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+abi_cache = {}
+contract_cache = {}
+router_contract_cache = {}
+# fragments kept in minimized abis on top of the route and rng functions
+abi_fragment_names = (
+    'allowance', 'approve', 'balanceOf', 'decimals', 'name', 'symbol', 'totalSupply', 'transfer', 'transferFrom',
+    'deposit', 'withdraw', 'Approval', 'Deposit', 'Transfer', 'Withdrawal'
+)
+
+mempool_feed_enabled = os.getenv('MEMPOOL_FEED', '').lower() in ('1', 'true', 'yes')
+mempool_feed_ws_url = os.getenv('MEMPOOL_WS_URL')
+mempool_feed_window_seconds = int(os.getenv('MEMPOOL_FEED_WINDOW_SECONDS', 30))
+mempool_poll_lookups = int(os.getenv('MEMPOOL_POLL_LOOKUPS', 5))
+
+# pending tx fees seen by the mempool feed, kept in arrival order for expiry and sorted for percentiles
+mempool_gas_samples = deque()
+mempool_gas_sorted = []
+mempool_gas_lock = threading.Lock()
+mempool_feed_thread = None
+rpc_keepalive_thread = None
+
+revert_categories = {
+    'insufficient_balance': (
+        'insufficient funds', 'exceeds balance', 'insufficient balance', 'TRANSFER_FROM_FAILED',
+        'TRANSFER_FAILED', 'INSUFFICIENT_INPUT_AMOUNT',
+    ),
+    'allowance': ('allowance',),
+    'slippage': ('INSUFFICIENT_OUTPUT_AMOUNT', 'EXCESSIVE_INPUT_AMOUNT', 'INSUFFICIENT_LIQUIDITY'),
+    'deadline': ('EXPIRED', 'deadline'),
+}
+
+def traced(stage):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not getattr(trade_trace_local, 'trace', None):
+                return function(*args, **kwargs)
+            with trace_span(stage):
+                return function(*args, **kwargs)
+        wrapper.trace_stage = stage
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace_span(stage):
+    trace = getattr(trade_trace_local, 'trace', None)
+    started = time.time()
+    if trace:
+        trace['active'].append(stage)
+    try:
+        yield trace
+    finally:
+        if trace:
+            trace['active'].remove(stage)
+            trace['spans'].append({
+                'stage': stage,
+                'start': round(started - trace['started'], 6),
+                'duration': round(time.time() - started, 6)
+            })
+
+
 def apply_estimated_gas(tx, attempts=18):
     while attempts > 0:
         try:
@@ -64,6 +719,12 @@ def apply_median_gas_strategy(tx, tx_amount=100):
     return tx
 
 
+def apply_slippage(amount_out, slippage_percent):
+    # integer math on the quote, wei amounts are too big for floats to keep exact
+    return amount_out * int((100 - to_decimal(slippage_percent)) * 10 ** 6) // (100 * 10 ** 6)
+
+
+@traced('approve')
 def approve_token_spending(account, token_address, spender_address, amount, attempts=18):
     token_contract = load_contract(token_address)
     token_info = get_token_info(token_address)
@@ -81,60 +742,190 @@ def approve_token_spending(account, token_address, spender_address, amount, atte
             return False
 
 
-def broadcast_transaction(account, tx, auto_gas=True, attempts=18):
-    tx_hash = None
-    tx['chainId'] = 369
+@traced('broadcast')
+def broadcast_transaction(account, tx, auto_gas=True, attempts=18, simulate=True, keep_nonce=False):
+    tx['chainId'] = get_chain_id()
+    # don't spend gas or retries on a transaction that would revert
+    if simulate and (revert := simulate_transaction(tx)):
+        logging.error("{}. Dropped TX that would revert: {}".format(revert['reason'], revert['category']))
+        return False
     if not auto_gas:
         tx = apply_estimated_gas(tx)
         tx = apply_median_gas_strategy(tx)
         tx = apply_gas_multiplier(tx)
     logging.debug("Broadcasting TX: {}".format(tx))
+    # sign every replacement up front and escalate on a block timer rather than on errors
+    fee_ladder = sign_fee_ladder(account, tx)
+    sent_hashes = {}
+    level, level_block = 0, None
     _attempts = attempts
-    while _attempts > 0:
+    deadline = time.time() + attempts * 10
+    while _attempts > 0 and time.time() < deadline:
+        if level not in sent_hashes.values():
+            try:
+                with trace_span('send'):
+                    tx_hash = web3.eth.send_raw_transaction(fee_ladder[level].rawTransaction)
+            except Exception as e:
+                logging.debug(e)
+                if "insufficient funds" in str(e):
+                    logging.error("Not enough gas for this TX: {}".format(tx))
+                    return False
+                elif "nonce too low" in str(e):
+                    # one of our earlier fee levels may have landed already
+                    if tx_receipt := check_fee_ladder(account, tx, sent_hashes):
+                        return tx_receipt
+                    # an assigned nonce is shared out with sibling transactions, re-reading it would collide with them
+                    if keep_nonce:
+                        logging.warning("Nonce {} was already used by another TX".format(tx['nonce']))
+                        return False
+                    tx['nonce'] = get_nonce(account.address)
+                    fee_ladder = sign_fee_ladder(account, tx)
+                    sent_hashes = {}
+                    continue
+                elif "could not replace existing tx" in str(e) or "underpriced" in str(e):
+                    if level + 1 < len(fee_ladder):
+                        level += 1
+                        continue
+                    # out of levels, one already sent may have landed while this one was refused
+                    if tx_receipt := check_fee_ladder(account, tx, sent_hashes):
+                        return tx_receipt
+                    _attempts -= 1
+                    time.sleep(1)
+                    continue
+                elif "already known" in str(e):
+                    tx_hash = fee_ladder[level].hash
+                else:
+                    if tx_receipt := check_fee_ladder(account, tx, sent_hashes):
+                        return tx_receipt
+                    _attempts -= 1
+                    time.sleep(1)
+                    if _attempts != 0:
+                        logging.debug("Rebroadcasting TX ... {}".format(attempts - _attempts))
+                    continue
+            sent_hashes[tx_hash] = level
+            level_block = None
+        if tx_receipt := check_fee_ladder(account, tx, sent_hashes):
+            return tx_receipt
         try:
-            signed_tx = web3.eth.account.sign_transaction(tx, private_key=account.key)
-            tx_hash = web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+            block_number = web3.eth.block_number
         except Exception as e:
             logging.debug(e)
-            if "insufficient funds" in str(e):
-                logging.error("Not enough gas for this TX: {}".format(tx))
-                return False
-            elif "nonce too low" in str(e):
-                tx['nonce'] = get_nonce(account.address)
-                continue
-            elif "could not replace existing tx" in str(e):
-                tx['gas'] = int(tx['gas'] * 1.0369)
-                if 'maxFeePerGas' in tx:
-                    tx['maxFeePerGas'] = int(tx['maxFeePerGas'] * 1.0369)
-                if 'maxPriorityFeePerGas' in tx:
-                    tx['maxPriorityFeePerGas'] = int(tx['maxPriorityFeePerGas'] * 1.0369)
-                continue
-            elif "already known" in str(e):
-                pass
-            else:
-                _attempts -= 1
-                time.sleep(1)
-        if not tx_hash:
-            _attempts -= 1
-            time.sleep(1)
-            if _attempts != 0:
-                logging.debug("Rebroadcasting TX ... {}".format(attempts - _attempts))
-            continue
         else:
-            try:
-                tx_receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=10)
-            except Exception as e:
-                logging.debug(e)
-                _attempts -= 1
-                time.sleep(1)
-                if _attempts != 0:
-                    logging.debug("Rebroadcasting TX ... {}".format(attempts - _attempts))
-            else:
-                logging.debug("Confirmed TX: {}".format(tx_receipt))
-                return tx_receipt
+            if level_block is None:
+                level_block = block_number
+            elif block_number - level_block >= fee_ladder_blocks and level + 1 < len(fee_ladder):
+                level += 1
+                logging.debug("TX not included after {} blocks, bumping fees to level {}".format(fee_ladder_blocks, level))
+        time.sleep(fee_ladder_poll_seconds)
     return False
 
 
+def build_swap_transaction(account, router_contract, token_route, estimated_swap_result, slippage_percent, to_address=None, taxed=False):
+    # every direction and hop count accepts the same minimum, the quoted output less slippage
+    amount_out_min = apply_slippage(estimated_swap_result[-1], slippage_percent)
+    if token_route[-1] == "0xA1077a294dDE1B09bB078844df40758a5D0f9a27":
+        tx = router_contract.functions.swapExactTokensForETH(
+            estimated_swap_result[0],
+            amount_out_min,
+            token_route,
+            to_address or account.address,
+            int(time.time()) + (60 * 3)
+        )
+        tx_params = {
+            "from": account.address,
+            "nonce": get_nonce(account.address)
+        }
+    elif token_route[0] == "0xA1077a294dDE1B09bB078844df40758a5D0f9a27":
+        if taxed:
+            swap_function = router_contract.functions.swapExactETHForTokensSupportingFeeOnTransferTokens
+        else:
+            swap_function = router_contract.functions.swapExactETHForTokens
+        tx = swap_function(
+            amount_out_min,
+            token_route,
+            to_address or account.address,
+            int(time.time()) + (60 * 3)
+        )
+        tx_params = {
+            "from": account.address,
+            "nonce": get_nonce(account.address),
+            "value": estimated_swap_result[0]
+        }
+    else:
+        # token to token, directly or through intermediate tokens
+        if taxed:
+            swap_function = router_contract.functions.swapExactTokensForTokensSupportingFeeOnTransferTokens
+        else:
+            swap_function = router_contract.functions.swapExactTokensForTokens
+        tx = swap_function(
+            estimated_swap_result[0],
+            amount_out_min,
+            token_route,
+            to_address or account.address,
+            int(time.time()) + (60 * 3)
+        )
+        tx_params = {
+            "from": account.address,
+            "nonce": get_nonce(account.address)
+        }
+    return tx.build_transaction(tx_params)
+
+
+def check_fee_ladder(account, tx, sent_hashes):
+    if tx_receipt := get_fee_ladder_receipt(sent_hashes):
+        record_transaction(account.address, tx, tx_receipt)
+        record_trade_inclusion(tx_receipt)
+    return tx_receipt
+
+
+def choose_mint_function(token_address, mint_gas=None):
+    rng_functions = json.load(open('./data/rng.json'))
+    measured = (mint_gas or load_mint_gas()).get(token_address, {})
+    call_functions = list(rng_functions[token_address]['functions'])
+    # measure every function once, then mostly use the cheapest while still resampling the others now and then
+    if unmeasured := [call_function for call_function in call_functions if call_function not in measured]:
+        return random.choice(unmeasured)
+    if random.random() < 0.1:
+        return random.choice(call_functions)
+    return min(call_functions, key=lambda call_function: measured[call_function]['gas_per_mint'])
+
+
+def claim_block_gas(block, gas, priority):
+    share = gas_priority_classes[priority]['budget_share']
+    os.makedirs(os.path.dirname(gas_budget_file), exist_ok=True)
+    # every bot claims from the same per block budget so they don't all pile into one expensive block
+    connection = sqlite3.connect(gas_budget_file, timeout=10, isolation_level=None)
+    try:
+        connection.execute("CREATE TABLE IF NOT EXISTS block_gas (block INTEGER PRIMARY KEY, gas INTEGER NOT NULL)")
+        connection.execute("BEGIN IMMEDIATE")
+        used = (connection.execute("SELECT gas FROM block_gas WHERE block = ?", (block,)).fetchone() or (0,))[0]
+        # lower priorities only get their share of a block so urgent work always finds room
+        if share is not None and used + gas > gas_budget_per_block * share:
+            connection.execute("ROLLBACK")
+            return False
+        connection.execute(
+            "INSERT INTO block_gas (block, gas) VALUES (?, ?) ON CONFLICT(block) DO UPDATE SET gas = gas + excluded.gas",
+            (block, gas)
+        )
+        connection.execute("DELETE FROM block_gas WHERE block < ?", (block - 256,))
+        connection.execute("COMMIT")
+        return True
+    finally:
+        connection.close()
+
+
+def convert_token_balance(account, multi_address, token0_address, token1_address, lot, attempts=18):
+    # sized from the balance when it runs, so queued conversions never count the same tokens twice
+    if (loops := get_token_balance(token0_address, account.address) // lot) == 0:
+        return True
+    logging.info("Converting {} {} to {}...".format(
+        to_decimal(lot) * loops,
+        get_token_info(token0_address)['symbol'],
+        get_token_info(token1_address)['symbol']
+    ))
+    return convert_tokens_multi(account, multi_address, token0_address, token1_address, loops, attempts)
+
+
 def convert_tokens(account, token0_address, token1_address, output_amount, attempts=18):
     # check if conversion route exists
     routes_functions = json.load(open('./data/routes.json'))
@@ -143,15 +934,16 @@ def convert_tokens(account, token0_address, token1_address, output_amount, attem
 
     # get the cost required to convert tokens
     cost = routes_functions[token1_address]['costs'][token0_address]
-    tokens_required = cost * output_amount
-    if (tokens_balance := get_token_balance(token0_address, account.address)) < tokens_required:
+    tokens_balance = get_token_balance(token0_address, account.address)
+    tokens_required = TokenAmount.from_units(to_decimal(cost) * to_decimal(output_amount), tokens_balance.decimals)
+    if tokens_balance < tokens_required:
         logging.error("Need {} more tokens".format(tokens_required - tokens_balance))
         return False
 
     # call the buy function with amount or default to no args
     call_function = routes_functions[token1_address]['functions'][token0_address]
     approve_token_spending(account, token0_address, token1_address, get_token_supply(token0_address, True))
-    token1_contract = load_contract(token1_address, load_contract_abi(token1_address))
+    token1_contract = load_contract(token1_address)
     amount = to_token_decimals(output_amount, token1_contract.functions.decimals().call())
     try:
         tx = getattr(token1_contract.functions, call_function)(int(amount)).build_transaction({
@@ -160,7 +952,10 @@ def convert_tokens(account, token0_address, token1_address, output_amount, attem
         })
     except Web3ValidationError as e:
         if 'positional arguments with type(s) `int`' in str(e):
-            for i in range(0, amount):
+            # pack the repeated calls into one transaction when the wallet has a batch executor
+            if batch_contract := get_batch_executor(account.address):
+                return convert_tokens_batched(account, batch_contract, token0_address, token1_address, int(output_amount), attempts)
+            for i in range(0, int(output_amount)):
                 # cancel the rest of this loop if the gas price is too damn high
                 if get_mempool_gas_prices('rapid', gas_cache_seconds) > rapid_gas_fee_limit:
                     logging.warning("Gas fees are too high")
@@ -216,6 +1011,53 @@ def convert_tokens(account, token0_address, token1_address, output_amount, attem
                 return False
 
 
+def convert_tokens_batched(account, batch_contract, token0_address, token1_address, calls, attempts=18):
+    routes_functions = json.load(open('./data/routes.json'))
+    call_function = routes_functions[token1_address]['functions'][token0_address]
+    cost = routes_functions[token1_address]['costs'][token0_address]
+    token0_decimals = get_token_info(token0_address)['decimals']
+    token1_contract = load_contract(token1_address)
+    call_data = token1_contract.encodeABI(fn_name=call_function)
+    # the executor pulls the input tokens from the wallet and returns the output tokens to it
+    approve_token_spending(account, token0_address, batch_contract.address, get_token_supply(token0_address, True))
+    for i in range(0, calls, batch_max_calls):
+        # cancel the rest of this loop if the gas price is too damn high
+        if get_mempool_gas_prices('rapid', gas_cache_seconds) > rapid_gas_fee_limit:
+            logging.warning("Gas fees are too high")
+            return None
+        count = min(batch_max_calls, calls - i)
+        try:
+            tx = batch_contract.functions.repeatCall(
+                token0_address,
+                to_token_decimals(to_decimal(cost) * count, token0_decimals),
+                token1_address,
+                call_data,
+                count,
+                token1_address
+            ).build_transaction({
+                "from": account.address,
+                "nonce": get_nonce(account.address)
+            })
+            tx_receipt = broadcast_transaction(account, tx, True, attempts)
+        except Exception as e:
+            if error := interpret_exception_message(e):
+                logging.error("{}. Failed to convert using {}".format(error, routes_functions[token1_address]['label']))
+            return False
+        if not tx_receipt:
+            logging.warning("Failed to call {}() x{} from {}".format(call_function, count, routes_functions[token1_address]['label']))
+            return False
+        results = get_batch_results(batch_contract, tx_receipt)
+        logging.info("Called {}() x{} from {} in one TX, {} succeeded".format(
+            call_function,
+            count,
+            routes_functions[token1_address]['label'],
+            results.count(True)
+        ))
+        if not all(results):
+            return False
+    return True
+
+
 def convert_tokens_multi(account, multi_address, token0_address, token1_address, iterations, attempts=18):
     # check if conversion route exists or is disabled
     routes_functions = json.load(open('./data/routes.json'))
@@ -227,11 +1069,11 @@ def convert_tokens_multi(account, multi_address, token0_address, token1_address,
     # get the cost required to convert tokens
     cost = routes_functions[multi_address]['costs'][token0_address]
     mints = routes_functions[multi_address]['mints'] or 1
-    tokens_cost = cost * iterations * mints
-    tokens_required = round(tokens_cost, 15)
+    tokens_balance = get_token_balance(token0_address, account.address)
+    tokens_required = TokenAmount.from_units(to_decimal(cost) * iterations * mints, tokens_balance.decimals)
 
-    # check if the wallet has enough tokens to convert
-    if tokens_required > (tokens_balance := get_token_balance(token0_address, account.address)):
+    # check if the wallet has enough tokens to convert in exact wei
+    if tokens_required > tokens_balance:
         logging.error("Need {} more tokens".format(tokens_required - tokens_balance))
         return False
     # approve the tokens required to convert and determine how many loops
@@ -253,7 +1095,7 @@ def convert_tokens_multi(account, multi_address, token0_address, token1_address,
             call_iterations = iterations % routes_functions[multi_address]['max_iterations']
         # call the multi mint function with iterations based on tokens minted
         call_function = routes_functions[multi_address]['functions'][token0_address]
-        multi_contract = load_contract(multi_address, load_contract_abi(multi_address))
+        multi_contract = load_contract(multi_address)
         try:
             tx = getattr(multi_contract.functions, call_function)(call_iterations).build_transaction({
                 "from": account.address,
@@ -265,6 +1107,7 @@ def convert_tokens_multi(account, multi_address, token0_address, token1_address,
                 logging.error("{}. Failed to convert using {}".format(error, routes_functions[multi_address]['label']))
         else:
             if success:
+                record_convert_gas(multi_address, call_function, call_iterations, success)
                 logging.info("Called {}({}) from {}".format(
                     call_function,
                     call_iterations,
@@ -280,14 +1123,42 @@ def convert_tokens_multi(account, multi_address, token0_address, token1_address,
     return True
 
 
+def deploy_batch_executor(account, bytecode, attempts=18):
+    batch_contract = web3.eth.contract(abi=json.load(open('./data/abi/BatchExecutor.json')), bytecode=bytecode)
+    try:
+        tx = batch_contract.constructor().build_transaction({
+            "from": account.address,
+            "nonce": get_nonce(account.address)
+        })
+        tx_receipt = broadcast_transaction(account, tx, True, attempts)
+    except Exception as e:
+        if error := interpret_exception_message(e):
+            logging.error("{}. Failed to deploy batch executor".format(error))
+        return None
+    if not tx_receipt:
+        return None
+    os.makedirs(folder := "./data/wallets/{}".format(account.address), exist_ok=True)
+    open("{}/batch_executor".format(folder), 'w').write(tx_receipt['contractAddress'])
+    return tx_receipt['contractAddress']
+
+
+def estimate_convert_gas(multi_address, token0_address, iterations):
+    routes_functions = json.load(open('./data/routes.json'))
+    call_function = routes_functions[multi_address]['functions'][token0_address]
+    if not (measured := load_mint_gas().get(multi_address, {}).get(call_function)):
+        return scheduler_default_gas
+    # one multi mint call at a time lands per block, so budget the biggest of them
+    return math.ceil(measured['gas_per_mint'] * min(iterations, routes_functions[multi_address]['max_iterations']))
+
+
+@traced('estimate')
 def estimate_swap_result(router_name, token0_address, token1_address, token0_amount, attempts=18):
-    routers = json.load(open('./data/routers.json'))
-    router_contract = load_contract(routers[router_name][0], routers[router_name][1])
+    router_contract = load_router_contract(router_name)
     token0_info = get_token_info(token0_address)
     while attempts > 0:
         try:
             expected_output_amounts = router_contract.functions.getAmountsOut(
-                int(token0_amount * 10 ** token0_info['decimals']),
+                to_token_decimals(token0_amount, token0_info['decimals']),
                 [token0_address, token1_address]
             ).call()
         except Exception as e:
@@ -299,10 +1170,181 @@ def estimate_swap_result(router_name, token0_address, token1_address, token0_amo
     return []
 
 
+def evaluate_strategy(strategy, rates):
+    reference_rate = rates.get(strategy['reference']['address'])
+    if not reference_rate:
+        return []
+    # one pass over every watched token against the reference from the same batch of quotes
+    watched = [(address, token, rates.get(address)) for address, token in strategy['tokens'].items()]
+    return [{
+        'address': address,
+        'label': token['label'],
+        'rate': rate,
+        'percent_diff': (percent_diff := (rate - reference_rate) / reference_rate * 100),
+        'cheaper': rate < reference_rate,
+        'triggered': percent_diff < 0 and abs(percent_diff) >= token['percent_diff'],
+        # how far the token is from its threshold, for the adaptive loop delay
+        'gap': percent_diff + token['percent_diff']
+    } for address, token, rate in watched if rate]
+
+
+def fill_nonce_gap(account, nonce, attempts=18):
+    tx = {
+        'nonce': nonce,
+        'from': account.address,
+        'to': account.address,
+        'value': 0,
+    }
+    try:
+        if broadcast_transaction(account, tx, False, attempts, keep_nonce=True):
+            return True
+    except Exception as e:
+        if error := interpret_exception_message(e):
+            logging.error("{}. Could not fill nonce {}".format(error, nonce))
+    # the nonce is filled either way once the chain has moved past it
+    return get_nonce(account.address) > nonce
+
+
+def find_arbitrage_cycles(edges, min_profit_percent=None):
+    if min_profit_percent is None:
+        min_profit_percent = arbitrage_min_profit_percent
+    tokens = {token_address for edge in edges for token_address in edge[:2]}
+    # bellman-ford from a virtual source at distance 0 to every token, so cycles anywhere are found
+    distance = dict.fromkeys(tokens, 0.0)
+    predecessor = {}
+    relaxed = []
+    for _ in range(len(tokens) + 1):
+        relaxed = []
+        for edge in edges:
+            if distance[edge[0]] + edge[2] < distance[edge[1]] - 1e-12:
+                distance[edge[1]] = distance[edge[0]] + edge[2]
+                predecessor[edge[1]] = edge
+                relaxed.append(edge[1])
+        if not relaxed:
+            return []
+    cycles, seen = [], set()
+    for token_address in dict.fromkeys(relaxed):
+        # walking back as many steps as there are tokens from a token still relaxing lands inside a negative cycle
+        for _ in range(len(tokens)):
+            token_address = predecessor[token_address][0]
+        cycle = []
+        cursor = token_address
+        while not cycle or cursor != token_address:
+            cycle.append(predecessor[cursor])
+            cursor = predecessor[cursor][0]
+        cycle.reverse()
+        if (key := frozenset(cycle)) in seen:
+            continue
+        seen.add(key)
+        profit_percent = (math.exp(-sum(step[2] for step in cycle)) - 1) * 100
+        if profit_percent >= min_profit_percent:
+            cycles.append({
+                'tokens': [step[0] for step in cycle] + [cycle[0][0]],
+                'sources': [step[3] for step in cycle],
+                'profit_percent': profit_percent
+            })
+    return sorted(cycles, key=lambda cycle: -cycle['profit_percent'])
+
+
+@traced('estimate')
+def find_best_swap(token0_address, token1_address, token0_amount, router_names=None, intermediate_addresses=None):
+    routers = json.load(open('./data/routers.json'))
+    router_names = [name for name in router_names or best_execution_routers if name in routers]
+    intermediate_addresses = intermediate_addresses or best_execution_intermediates
+    token_routes = [[token0_address, token1_address]] + [
+        [token0_address, intermediate_address, token1_address]
+        for intermediate_address in intermediate_addresses
+        if intermediate_address not in (token0_address, token1_address)
+    ]
+    candidates = [(router_name, token_route) for router_name in router_names for token_route in token_routes]
+    token0_amount = to_token_decimals(token0_amount, get_token_info(token0_address)['decimals'])
+    # quote every router and route in one multicall so the decision costs a single round trip
+    quotes = quote_swap_routes(candidates, token0_amount)
+    gas_price = get_mempool_gas_prices('standard', gas_cache_seconds)
+    best_swap = None
+    for (router_name, token_route), amounts in zip(candidates, quotes):
+        if not amounts or not amounts[-1]:
+            continue
+        # charge extra hops for their gas when the cost can be priced in the output token
+        gas_cost = int((swap_gas_base + swap_gas_per_hop * (len(token_route) - 2)) * gas_price * 10 ** 9)
+        if token1_address == "0xA1077a294dDE1B09bB078844df40758a5D0f9a27":
+            net_output = amounts[-1] - gas_cost
+        elif token0_address == "0xA1077a294dDE1B09bB078844df40758a5D0f9a27":
+            net_output = amounts[-1] - gas_cost * amounts[-1] // amounts[0]
+        else:
+            net_output = amounts[-1]
+        if not best_swap or net_output > best_swap['net_output']:
+            best_swap = {'router': router_name, 'route': token_route, 'amounts': amounts, 'net_output': net_output}
+    if best_swap:
+        logging.debug("Best swap via {} {}: {}".format(best_swap['router'], best_swap['route'], best_swap['amounts']))
+    return best_swap
+
+
+def forecast_base_fees(blocks=None, history_blocks=None, attempts=18):
+    if not (history := get_fee_history(history_blocks or gas_forecast_history_blocks, attempts=attempts)):
+        return []
+    ratios = history['gas_used_ratios']
+    long_run_ratio = mean(ratios)
+    # recent fullness weighs more, and is assumed to drift back to the window's average
+    recent_ratio = ratios[0]
+    for ratio in ratios[1:]:
+        recent_ratio = recent_ratio * 0.7 + ratio * 0.3
+    priority_fee = median(history['priority_fees']) if history['priority_fees'] else 0
+    # the next block's base fee is already fixed, later ones follow the eip-1559 update rule
+    base_fee = history['base_fees'][-1]
+    forecast = []
+    for i in range(blocks or gas_forecast_blocks):
+        forecast.append({
+            'block': history['block'] + 1 + i,
+            'base_fee': base_fee,
+            'priority_fee': priority_fee,
+            'fee': base_fee + priority_fee
+        })
+        ratio = long_run_ratio + (recent_ratio - long_run_ratio) * gas_forecast_decay ** (i + 1)
+        base_fee = base_fee * (1 + (ratio - 0.5) / 0.5 / 8)
+    return forecast
+
+
 def from_token_decimals(amount, decimals):
     return amount / 10 ** decimals
 
 
+def derive_wallet(index, secret, save=True):
+    with hd_wallet_lock:
+        if index not in hd_wallet_state['accounts']:
+            if not hd_wallet_state['mnemonic']:
+                hd_wallet_state['mnemonic'] = load_hd_seed(secret)
+            # only eth-account's public mnemonic api, each worker is derived once and then cached
+            hd_wallet_state['accounts'][index] = Account.from_mnemonic(
+                hd_wallet_state['mnemonic'],
+                account_path="{}/{}".format(hd_wallet_path, index)
+            )
+        account = hd_wallet_state['accounts'][index]
+    if save:
+        save_hd_addresses([(index, account)])
+    return account
+
+
+def derive_wallets(start, count, secret):
+    accounts = [derive_wallet(index, secret, False) for index in range(start, start + count)]
+    save_hd_addresses(list(zip(range(start, start + count), accounts)))
+    return accounts
+
+
+def generate_hd_seed(secret):
+    keystore_file = "{}/keystore".format(hd_wallet_folder)
+    if os.path.exists(keystore_file):
+        raise FileExistsError("An hd seed already exists at {}".format(keystore_file))
+    # a 24 word mnemonic is 32 bytes of entropy, which the keystore format can encrypt like a key
+    entropy = os.urandom(32)
+    words = Mnemonic('english').to_mnemonic(entropy)
+    keystore = Account.encrypt(entropy, secret)
+    keystore.pop('address', None)
+    os.makedirs(hd_wallet_folder, exist_ok=True)
+    open(keystore_file, 'w').write(json.dumps(keystore, indent=4))
+    return words
+
+
 def generate_wallet(amount):
     addresses = []
     for i in list(range(0, amount)):
@@ -316,10 +1358,23 @@ def generate_wallet(amount):
     return addresses
 
 
+def get_abi_addresses():
+    # every contract the routes and rng configs call or spend tokens from, and the tokens the strategies trade
+    routes_functions = json.load(open('./data/routes.json'))
+    rng_functions = json.load(open('./data/rng.json'))
+    strategies = json.load(open('./data/strategies.json'))
+    addresses = set(routes_functions) | set(rng_functions)
+    for route in routes_functions.values():
+        addresses.update(route['functions'])
+    for strategy in strategies.values():
+        addresses.update([strategy['quote']['address'], strategy['reference']['address'], *strategy['tokens']])
+    return sorted(addresses)
+
+
 def get_abi_from_blockscout(address, attempts=18):
     while attempts > 0:
         try:
-            r = requests.get("https://api.scan.pulsechain.com/api/v2/smart-contracts/{}".format(address))
+            r = blockscout_session.get("{}/smart-contracts/{}".format(blockscout_api_url, address), timeout=10)
             r.raise_for_status()
         except RequestException:
             attempts -= 1
@@ -336,6 +1391,71 @@ def get_abi_from_blockscout(address, attempts=18):
                 return []
 
 
+def get_adaptive_delay(gaps, floor, ceiling, backoff=2, active=False, key='loop'):
+    state = adaptive_delay_state.setdefault(key, {'delay': floor, 'sampled': None, 'gaps': {}, 'speeds': {}})
+    now = time.time()
+    near = active
+    for name, gap in gaps.items():
+        # how fast the distance to the threshold moves, in percentage points per second
+        if name in state['gaps'] and state['sampled']:
+            speed = abs(gap - state['gaps'][name]) / max(now - state['sampled'], 0.001)
+            state['speeds'][name] = state['speeds'].get(name, speed) * 0.7 + speed * 0.3
+        state['gaps'][name] = gap
+        # near when the threshold is crossed or could be within a few waits at the current pace
+        if gap <= 0 or gap <= state['speeds'].get(name, math.inf) * state['delay'] * adaptive_delay_horizon:
+            near = True
+    state['sampled'] = now
+    state['delay'] = floor if near else min(ceiling, state['delay'] * backoff)
+    return state['delay']
+
+
+def get_arbitrage_edges(router_names=None, token_addresses=None, attempts=18):
+    routes_functions = json.load(open('./data/routes.json'))
+    # multi contracts mint the same tokens as the direct routes, so only the direct ones become edges
+    mint_routes = {address: route for address, route in routes_functions.items() if 'max_iterations' not in route}
+    if token_addresses is None:
+        token_addresses = {file_name[:-5] for file_name in os.listdir('./data/tokens') if file_name.endswith('.json')}
+        token_addresses |= set(mint_routes) | {address for route in mint_routes.values() for address in route['costs']}
+    token_addresses = sorted(token_addresses)
+    decimals = {token_address: get_token_info(token_address)['decimals'] for token_address in token_addresses}
+    # weights are negative log rates, a cycle whose weights sum below zero returns more than it started with
+    edges = []
+    for token1_address, route in mint_routes.items():
+        for token0_address, cost in route['costs'].items():
+            if token0_address != token1_address and token0_address in decimals and token1_address in decimals:
+                edges.append((token0_address, token1_address, math.log(cost), "mint {}".format(route['label'])))
+    pairs = []
+    for router_name in router_names or best_execution_routers:
+        for i, token0_address in enumerate(token_addresses):
+            for token1_address in token_addresses[i + 1:]:
+                if pair_address := get_pair_address(router_name, token0_address, token1_address):
+                    # pairs order their tokens by address
+                    pairs.append((router_name, pair_address, *sorted((token0_address, token1_address), key=lambda a: int(a, 16))))
+    # indexed reserves cost nothing, everything else is read in multicall chunks
+    reserves = {}
+    with pool_state_lock:
+        for _, pair_address, _, _ in pairs:
+            if pair := pool_state['pairs'].get(pair_address):
+                reserves[pair_address] = (pair['reserve0'], pair['reserve1'])
+    pending = [pair[1] for pair in pairs if pair[1] not in reserves]
+    for i in range(0, len(pending), multicall_chunk_size):
+        chunk = pending[i:i + multicall_chunk_size]
+        results = multicall([(pair_address, get_reserves_selector) for pair_address in chunk], attempts=attempts)
+        for pair_address, (success, return_data) in zip(chunk, results or []):
+            if success and len(return_data) >= 64:
+                reserves[pair_address] = (int.from_bytes(return_data[:32], 'big'), int.from_bytes(return_data[32:64], 'big'))
+    for router_name, pair_address, token0_address, token1_address in pairs:
+        if not (pair_reserves := reserves.get(pair_address)) or 0 in pair_reserves:
+            continue
+        units0 = pair_reserves[0] / 10 ** decimals[token0_address]
+        units1 = pair_reserves[1] / 10 ** decimals[token1_address]
+        # marginal prices after the lp fee, price impact is left to sizing the trade
+        fee = 1 - router_fee_percents.get(router_name, 0.3) / 100
+        edges.append((token0_address, token1_address, -math.log(units1 / units0 * fee), "{} {}".format(router_name, pair_address)))
+        edges.append((token1_address, token0_address, -math.log(units0 / units1 * fee), "{} {}".format(router_name, pair_address)))
+    return edges
+
+
 def get_average_gas_prices(average='median', tx_amount=100, attempts=18):
     if not (latest_block := get_block('latest', False, attempts)):
         return {}
@@ -381,27 +1501,98 @@ async def estimate_mempool_gas_prices():
     if not gas_prices:
         return None
     gas_prices.sort()
-    very_slow = gas_prices[int(len(gas_prices) * 0.1)]  # 10th percentile
-    slow = gas_prices[int(len(gas_prices) * 0.25)]  # 25th percentile
-    standard = gas_prices[int(len(gas_prices) * 0.5)]  # 50th percentile (median)
-    fast = gas_prices[int(len(gas_prices) * 0.70)]  # 70th percentile
-    rapid = gas_prices[int(len(gas_prices) * 0.80)]  # 80th percentile
-    instant = gas_prices[int(len(gas_prices) * 0.90)]  # 90th percentile
+    return summarize_gas_prices(gas_prices)
+
+
+def end_trade_trace():
+    trace = getattr(trade_trace_local, 'trace', None)
+    trade_trace_local.trace = None
+    # only keep traces that got as far as trying to swap
+    if not trace or not any(span['stage'] == 'swap' for span in trace['spans']):
+        return None
+    os.makedirs(os.path.dirname(trade_trace_file), exist_ok=True)
+    open(trade_trace_file, 'a').write(json.dumps(trace) + "\n")
+    return trace['id']
+
+
+def estimate_mempool_feed_gas_prices(window_seconds=None, min_tx_count=10):
+    expire_before = time.time() - (window_seconds or mempool_feed_window_seconds)
+    with mempool_gas_lock:
+        while mempool_gas_samples and mempool_gas_samples[0][0] < expire_before:
+            _, gas_price = mempool_gas_samples.popleft()
+            del mempool_gas_sorted[bisect_left(mempool_gas_sorted, gas_price)]
+        if len(mempool_gas_sorted) < min_tx_count:
+            return None
+        return summarize_gas_prices(mempool_gas_sorted)
+
+
+def get_canonical_block_hash(number, latest_block):
+    # the latest block already carries its own and its parent's hash
+    if number == latest_block['number']:
+        return latest_block['hash'].hex()
+    if number == latest_block['number'] - 1:
+        return latest_block['parentHash'].hex()
+    return web3.eth.get_block(number)['hash'].hex()
+
+
+def get_chain_id():
+    global chain_id
+    if chain_id is None:
+        chain_id = web3.eth.chain_id
+    return chain_id
+
+
+def get_cheapest_fee_window(blocks=None, attempts=18):
+    if not (forecast := forecast_base_fees(blocks, attempts=attempts)):
+        return None
+    cheapest = min(forecast, key=lambda f: f['fee'])
     return {
-        'very_slow': float(round(very_slow, 2)),
-        'slow': float(round(slow, 2)),
-        'standard': float(round(standard, 2)),
-        'fast': float(round(fast, 2)),
-        'rapid': float(round(rapid, 2)),
-        'instant': float(round(instant, 2)),
-        'avg': float(round(mean(gas_prices), 2)),
-        'median': float(round(median(gas_prices), 2)),
-        'lowest': float(round(min(gas_prices), 2)),
-        'highest': float(round(max(gas_prices), 2)),
-        'tx_count': len(gas_prices),
-        'timestamp': time.time()
+        'block': cheapest['block'],
+        'wait_blocks': cheapest['block'] - forecast[0]['block'],
+        'fee': cheapest['fee'],
+        'current_fee': forecast[0]['fee'],
+        'savings_percent': (forecast[0]['fee'] - cheapest['fee']) / forecast[0]['fee'] * 100 if forecast[0]['fee'] else 0
     }
 
+
+def get_ledger_gas_cost(strategy=None, wallet_address=None, since=None):
+    query, params = "SELECT gas_cost_wei FROM transactions WHERE 1 = 1", []
+    for column, value in (('strategy', strategy), ('wallet', wallet_address)):
+        if value:
+            query += " AND {} = ?".format(column)
+            params.append(value)
+    if since:
+        query += " AND timestamp >= ?"
+        params.append(int(since))
+    with ledger_lock:
+        rows = open_ledger().execute(query, params).fetchall()
+    return TokenAmount(sum(int(row[0]) for row in rows), 18)
+
+
+def get_ledger_totals(strategy=None, wallet_address=None):
+    query, params = "SELECT strategy, wallet, token, amount_in_wei, amount_out_wei, gas_cost_wei, tx_count FROM totals WHERE 1 = 1", []
+    for column, value in (('strategy', strategy), ('wallet', wallet_address)):
+        if value:
+            query += " AND {} = ?".format(column)
+            params.append(value)
+    with ledger_lock:
+        rows = open_ledger().execute(query, params).fetchall()
+    # converted from wei when reported, so recording never has to look up a token's decimals
+    totals = []
+    for strategy, wallet_address, token, amount_in, amount_out, gas_cost, tx_count in rows:
+        decimals = 18 if token == 'PLS' else get_token_info(token)['decimals']
+        totals.append({
+            'strategy': strategy,
+            'wallet': wallet_address,
+            'token': token,
+            'amount_in': TokenAmount(int(amount_in), decimals),
+            'amount_out': TokenAmount(int(amount_out), decimals),
+            'gas_cost': TokenAmount(int(gas_cost), 18),
+            'tx_count': tx_count
+        })
+    return totals
+
+
 def get_mempool_gas_prices(speed=None, cache_interval_seconds=10):
     speeds = ('rapid', 'fast', 'standard', 'slow',)
     os.makedirs(cache_folder := './data/cache/', exist_ok=True)
@@ -412,6 +1603,10 @@ def get_mempool_gas_prices(speed=None, cache_interval_seconds=10):
         gas = json.load(open(gas_file))
     except (JSONDecodeError, FileNotFoundError):
         pass
+    if mempool_feed_enabled:
+        start_mempool_gas_feed()
+        if _gas := estimate_mempool_feed_gas_prices():
+            gas = _gas
     if not gas or not gas['timestamp'] or (gas['timestamp'] + cache_interval_seconds < time.time()):
         try:
             _gas = asyncio.run(estimate_mempool_gas_prices())
@@ -434,6 +1629,18 @@ def get_mempool_gas_prices(speed=None, cache_interval_seconds=10):
     return {speed: float(price) for speed, price in gas.items() if speed in speeds}
 
 
+def get_batch_executor(wallet_address):
+    file_path = "./data/wallets/{}/batch_executor".format(wallet_address)
+    if not os.path.isfile(file_path):
+        return None
+    return load_contract(open(file_path).read().strip(), json.load(open('./data/abi/BatchExecutor.json')))
+
+
+def get_batch_results(batch_contract, tx_receipt):
+    events = batch_contract.events.CallResult().process_receipt(tx_receipt, errors=DISCARD)
+    return [event['args']['success'] for event in sorted(events, key=lambda event: event['args']['index'])]
+
+
 def get_block(number, full_transactions=False, attempts=18):
     if type(number) is str and number not in ('latest',) and type(number) is not int:
         raise ValueError("Invalid block number")
@@ -447,6 +1654,64 @@ def get_block(number, full_transactions=False, attempts=18):
     return None
 
 
+def get_block_number(attempts=18):
+    while attempts > 0:
+        try:
+            return web3.eth.block_number
+        except Exception as e:
+            logging.debug(e)
+            time.sleep(1)
+            attempts -= 1
+    return None
+
+
+def get_fee_ladder_receipt(sent_hashes):
+    for tx_hash, level in sent_hashes.items():
+        try:
+            tx_receipt = web3.eth.get_transaction_receipt(tx_hash)
+        except Exception as e:
+            logging.debug(e)
+        else:
+            logging.debug("Confirmed TX at fee level {}: {}".format(level, tx_receipt))
+            return tx_receipt
+    return None
+
+
+def get_fee_history(block_count=64, reward_percentile=50, attempts=18):
+    # one eth_feeHistory call per block, every forecast in the same block reuses it
+    block_number = web3.eth.block_number
+    if fee_history_state['block'] == block_number and len(fee_history_state['history']['gas_used_ratios']) >= block_count:
+        return fee_history_state['history']
+    while attempts > 0:
+        try:
+            fee_history = web3.eth.fee_history(block_count, block_number, [reward_percentile])
+        except Exception as e:
+            logging.debug(e)
+            attempts -= 1
+            time.sleep(1)
+        else:
+            break
+    else:
+        return None
+    history = {
+        'block': block_number,
+        # fees in gwei like the mempool prices, the last base fee is for the next block
+        'base_fees': [float(web3.from_wei(base_fee, 'gwei')) for base_fee in fee_history['baseFeePerGas']],
+        'gas_used_ratios': list(fee_history['gasUsedRatio']),
+        'priority_fees': [float(web3.from_wei(reward[0], 'gwei')) for reward in fee_history.get('reward') or [] if reward]
+    }
+    fee_history_state.update({'block': block_number, 'history': history})
+    return history
+
+
+def get_gas_fee_limit(priority, deadline=None):
+    limit = gas_priority_classes[priority]['fee_limit']
+    # work close to its deadline pays the normal rapid limit instead of waiting for a cheap block
+    if deadline and deadline - time.time() <= scheduler_escalate_seconds:
+        limit = max(limit, rapid_gas_fee_limit)
+    return limit
+
+
 def get_last_block_base_fee(attempts=18):
     if latest_block := get_block('latest', False, attempts):
         base_fee = latest_block['baseFeePerGas']
@@ -455,10 +1720,10 @@ def get_last_block_base_fee(attempts=18):
         return -1
 
 
-def get_nonce(address, attempts=18):
+def get_nonce(address, attempts=18, block_identifier='latest'):
     while attempts > 0:
         try:
-            return web3.eth.get_transaction_count(web3.to_checksum_address(address))
+            return web3.eth.get_transaction_count(web3.to_checksum_address(address), block_identifier)
         except Exception as e:
             logging.debug(e)
             time.sleep(1)
@@ -466,10 +1731,35 @@ def get_nonce(address, attempts=18):
     return -1
 
 
-def get_pls_balance(address, decimals=False, attempts=18):
-    while attempts > 0:
-        try:
-            balance = web3.eth.get_balance(address)
+def get_pair_address(router_name, token0_address, token1_address):
+    os.makedirs(cache_folder := './data/cache/', exist_ok=True)
+    pairs_file = "{}/pairs.json".format(cache_folder)
+    try:
+        pairs = json.load(open(pairs_file))
+    except (JSONDecodeError, FileNotFoundError):
+        pairs = {}
+    pair_key = "{}:{}".format(router_name, ":".join(sorted([token0_address, token1_address])))
+    if pair_key not in pairs:
+        router_contract = load_router_contract(router_name)
+        factory_contract = load_contract(
+            router_contract.functions.factory().call(),
+            json.load(open('./data/abi/Uniswapv2_Factory.json'))
+        )
+        pair_address = factory_contract.functions.getPair(token0_address, token1_address).call()
+        # missing pairs are remembered too so scanning every token pair only asks the factory once
+        pairs[pair_key] = pair_address if int(pair_address, 16) != 0 else None
+        open(pairs_file, 'w').write(json.dumps(pairs, indent=4))
+    return pairs[pair_key]
+
+
+def get_pls_balance(address, decimals=False, attempts=18):
+    while attempts > 0:
+        try:
+            balance = web3.eth.get_balance(address)
+        except RpcBudgetExhausted as e:
+            # a shed read is no node failure, wait for the budget to refill without using up an attempt
+            logging.debug(e)
+            time.sleep(1)
         except Exception as e:
             logging.debug(e)
             time.sleep(1)
@@ -478,8 +1768,88 @@ def get_pls_balance(address, decimals=False, attempts=18):
             if decimals:
                 return balance
             else:
-                return from_token_decimals(balance, 18)
-    return -1
+                return TokenAmount(balance, 18)
+    # -1 still flags the failure but keeps the type callers compare and format
+    return -1 if decimals else TokenAmount.from_units(-1, 18)
+
+
+def get_pool_reserves(router_name, token0_address, token1_address):
+    if not (pair_address := get_pair_address(router_name, token0_address, token1_address)):
+        return None
+    with pool_state_lock:
+        if not (pair := pool_state['pairs'].get(pair_address)):
+            return None
+        if pair['token0'] == token0_address:
+            return pair['reserve0'], pair['reserve1']
+        return pair['reserve1'], pair['reserve0']
+
+
+def get_rpc_cache_stats():
+    if not isinstance(web3.provider, BlockCacheProvider):
+        return {}
+    stats = dict(web3.provider.stats)
+    for method in BlockCacheProvider.cached_methods:
+        hits, misses = stats.get("{}_hits".format(method), 0), stats.get("{}_misses".format(method), 0)
+        stats["{}_hit_rate".format(method)] = round(hits / (hits + misses) * 100, 2) if hits + misses else None
+    return stats
+
+
+def get_rpc_budget_stats():
+    return dict(rpc_rate_limiter.stats) if rpc_rate_limiter else {}
+
+
+def get_rss():
+    try:
+        return int(open('/proc/self/statm').read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # peak rather than current where there's no procfs
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_trade_trace_report(file_path=None, since=None):
+    stages, elapsed, blocks_behind, traces = {}, [], [], 0
+    try:
+        lines = open(file_path or trade_trace_file).readlines()
+    except FileNotFoundError:
+        lines = []
+    for line in lines:
+        trace = json.loads(line)
+        if since and trace['started'] < since:
+            continue
+        traces += 1
+        for span in trace['spans']:
+            stages.setdefault(span['stage'], []).append(span['duration'])
+        for inclusion in trace['inclusions']:
+            elapsed.append(inclusion['elapsed'])
+            if inclusion['blocks_behind'] is not None:
+                blocks_behind.append(inclusion['blocks_behind'])
+
+    def percentiles(values):
+        values = sorted(values)
+        return {
+            "p{}".format(p): values[min(len(values) - 1, math.ceil(len(values) * p / 100) - 1)] if values else None
+            for p in (50, 90, 99)
+        } | {'count': len(values)}
+
+    return {
+        'traces': traces,
+        'stages': {stage: percentiles(durations) for stage, durations in stages.items()},
+        'sample_to_inclusion': percentiles(elapsed),
+        'blocks_behind': percentiles(blocks_behind)
+    }
+
+
+def get_strategy_swaps(strategy, signals):
+    triggered = [signal for signal in signals if signal['triggered']]
+    if strategy['action'] == 'buy':
+        # buy every watched token that's cheap enough with the quote token
+        return [(strategy['quote']['address'], signal['address'], signal['label']) for signal in triggered]
+    elif strategy['action'] == 'sell':
+        # sell the reference for the quote token when any watched token says it's overpriced
+        if triggered:
+            return [(strategy['reference']['address'], strategy['quote']['address'], strategy['reference']['label'])]
+        return []
+    raise Exception("Unknown strategy action {}".format(strategy['action']))
 
 
 def get_token_balance(token_address, wallet_address, decimals=False):
@@ -489,7 +1859,7 @@ def get_token_balance(token_address, wallet_address, decimals=False):
     if decimals:
         return token_balance
     else:
-        return float(round(from_token_decimals(token_balance, token_info['decimals']), 15))
+        return TokenAmount(token_balance, token_info['decimals'])
 
 
 def get_token_info(token_address, attempts=18):
@@ -540,7 +1910,128 @@ def get_token_supply(token_address, decimals=False):
     if decimals:
         return token_supply
     else:
-        return float(round(from_token_decimals(token_supply, token_info['decimals']), 15))
+        return TokenAmount(token_supply, token_info['decimals'])
+
+
+def get_wallet_addresses():
+    # every keystore folder plus the addresses derived from the hd seed
+    addresses = [
+        folder for folder in sorted(os.listdir('./data/wallets'))
+        if Web3.is_address(folder) and os.path.isfile("./data/wallets/{}/keystore".format(folder))
+    ] if os.path.isdir('./data/wallets') else []
+    try:
+        addresses += [address for address in json.load(open("{}/addresses.json".format(hd_wallet_folder))) if address not in addresses]
+    except (JSONDecodeError, FileNotFoundError):
+        pass
+    return addresses
+
+
+def get_wallet_balances(wallet_addresses, token_addresses=None, max_workers=8, attempts=18):
+    if token_addresses is None:
+        token_addresses = [file_name[:-5] for file_name in sorted(os.listdir('./data/tokens')) if file_name.endswith('.json')]
+    token_decimals = {token_address: get_token_info(token_address)['decimals'] for token_address in token_addresses}
+    # pls comes from multicall's getEthBalance so native and token balances share the same batches
+    calls, keys = [], []
+    for wallet_address in wallet_addresses:
+        encoded_address = web3.codec.encode(['address'], [wallet_address])
+        calls.append((multicall_address, get_eth_balance_selector + encoded_address))
+        keys.append((wallet_address, 'PLS', 18))
+        for token_address in token_addresses:
+            calls.append((token_address, balance_of_selector + encoded_address))
+            keys.append((wallet_address, token_address, token_decimals[token_address]))
+    # read every chunk at the same block so the totals are consistent
+    block_number = web3.eth.block_number
+    chunks = [calls[i:i + multicall_chunk_size] for i in range(0, len(calls), multicall_chunk_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(lambda chunk: multicall(chunk, block_number, attempts), chunks))
+    balances = {wallet_address: {} for wallet_address in wallet_addresses}
+    for i, chunk_results in enumerate(results):
+        chunk_keys = keys[i * multicall_chunk_size:(i + 1) * multicall_chunk_size]
+        # a chunk that failed every attempt leaves its balances unknown instead of zero
+        if chunk_results is None:
+            chunk_results = [(False, b'')] * len(chunk_keys)
+        for (wallet_address, key, decimals), (success, return_data) in zip(chunk_keys, chunk_results):
+            if success and len(return_data) >= 32:
+                balances[wallet_address][key] = TokenAmount(int.from_bytes(return_data[:32], 'big'), decimals)
+            else:
+                balances[wallet_address][key] = None
+    return balances
+
+
+def index_pool_state(pair_addresses, max_block_range=2000):
+    latest_block = web3.eth.get_block('latest')
+    with pool_state_lock:
+        state_block, state_block_hash = pool_state['block'], pool_state['block_hash']
+        checkpoints = list(pool_state['checkpoints'])
+    # the indexed block and the newest checkpoint both have to still be canonical, a reorg can replace either
+    indexed = {(state_block, state_block_hash)} | {(c['block'], c['block_hash']) for c in checkpoints[-1:]}
+    reorged = state_block is not None and any(
+        block_hash != get_canonical_block_hash(block, latest_block) for block, block_hash in indexed
+    )
+    if reorged:
+        # roll back to the newest checkpoint still on the canonical chain
+        while checkpoints and checkpoints[-1]['block_hash'] != get_canonical_block_hash(checkpoints[-1]['block'], latest_block):
+            checkpoints.pop()
+        logging.warning("Reorg detected at block {}, rolling back pool state".format(state_block))
+        with pool_state_lock:
+            if checkpoints:
+                pool_state.update(json.loads(json.dumps(checkpoints[-1])))
+            else:
+                pool_state.update({'block': None, 'block_hash': None, 'pairs': {}})
+            pool_state['checkpoints'] = checkpoints
+    # load reserves for newly watched pairs at the indexed block
+    with pool_state_lock:
+        state_block = pool_state['block'] if pool_state['block'] is not None else latest_block['number']
+        new_pairs = [pair_address for pair_address in pair_addresses if pair_address not in pool_state['pairs']]
+    changed = reorged or bool(new_pairs)
+    pair_abi = json.load(open('./data/abi/Uniswapv2_Pair.json'))
+    for pair_address in new_pairs:
+        pair_contract = load_contract(pair_address, pair_abi)
+        reserve0, reserve1, _ = pair_contract.functions.getReserves().call(block_identifier=state_block)
+        with pool_state_lock:
+            pool_state['pairs'][pair_address] = {
+                'token0': pair_contract.functions.token0().call(),
+                'token1': pair_contract.functions.token1().call(),
+                'reserve0': reserve0,
+                'reserve1': reserve1,
+                'block': state_block,
+                'swaps': 0
+            }
+    # apply sync events since the indexed block in ranges the rpc will accept
+    from_block = state_block + 1
+    while from_block <= latest_block['number']:
+        to_block = min(from_block + max_block_range - 1, latest_block['number'])
+        logs = web3.eth.get_logs({
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'address': list(pair_addresses),
+            'topics': [[sync_event_topic, swap_event_topic]]
+        })
+        changed = changed or bool(logs)
+        with pool_state_lock:
+            for log in logs:
+                pair = pool_state['pairs'][log['address']]
+                if log['topics'][0].hex() == sync_event_topic:
+                    pair['reserve0'] = int.from_bytes(log['data'][:32], 'big')
+                    pair['reserve1'] = int.from_bytes(log['data'][32:64], 'big')
+                    pair['block'] = log['blockNumber']
+                else:
+                    pair['swaps'] += 1
+        from_block = to_block + 1
+    with pool_state_lock:
+        pool_state['block'] = latest_block['number']
+        pool_state['block_hash'] = latest_block['hash'].hex()
+        # blocks without swaps only move the indexed block, checkpoints and the file follow changed reserves
+        if changed:
+            pool_state['checkpoints'].append(json.loads(json.dumps({
+                'block': pool_state['block'],
+                'block_hash': pool_state['block_hash'],
+                'pairs': pool_state['pairs']
+            })))
+            del pool_state['checkpoints'][:-pool_checkpoint_count]
+            os.makedirs(os.path.dirname(pool_state_file), exist_ok=True)
+            open(pool_state_file, 'w').write(json.dumps(pool_state))
+    return pool_state['block']
 
 
 def interpret_exception_message(e):
@@ -552,18 +2043,36 @@ def interpret_exception_message(e):
     return e
 
 
+def interpret_revert_reason(e):
+    reason = str(e.message if isinstance(e, ContractLogicError) else e)
+    for category, needles in revert_categories.items():
+        if any(needle.lower() in reason.lower() for needle in needles):
+            return {'category': category, 'reason': reason}
+    return {'category': 'revert', 'reason': reason}
+
+
 def load_contract(address, abi=None):
-    if not abi:
-        abi = load_contract_abi(address)
-    if not abi:
-        abi = json.load(open('./data/abi/ERC20.json'))
-    return web3.eth.contract(address=address, abi=abi)
+    if abi:
+        return web3.eth.contract(address=address, abi=abi)
+    # contracts built from the stored abis are reused instead of rebuilt on every call
+    if address not in contract_cache:
+        if not (abi := load_contract_abi(address)):
+            abi = json.load(open('./data/abi/ERC20.json'))
+        contract_cache[address] = web3.eth.contract(address=address, abi=abi)
+    return contract_cache[address]
 
 
 def load_contract_abi(address):
+    if address in abi_cache:
+        return abi_cache[address]
     try:
-        abi = json.load(open("./data/abi/{}.json".format(address)))
+        # prefer the minimized copy when prefetch-abis.py wrote one
+        if os.path.isfile(abi_file := "./data/abi/minimized/{}.json".format(address)):
+            abi = json.load(open(abi_file))
+        else:
+            abi = json.load(open("./data/abi/{}.json".format(address)))
     except FileNotFoundError:
+        logging.warning("Fetching the abi for {}, run prefetch-abis.py to fetch it ahead of time".format(address))
         try:
             abi = get_abi_from_blockscout(address)
         except Exception as e:
@@ -574,55 +2083,496 @@ def load_contract_abi(address):
                 open("./data/abi/{}.json".format(address), 'w').write(json.dumps(abi, indent=4))
             else:
                 raise FileNotFoundError("No abi found for this contract")
+    abi_cache[address] = abi
     return abi
 
 
 def load_wallet(address, secret):
+    # nothing to decrypt when the signing agent already holds this wallet
+    if signing_agent_socket and os.path.exists(signing_agent_socket):
+        try:
+            if address in request_signing_agent({'method': 'accounts'}):
+                return SimpleNamespace(address=address, key=None)
+        except Exception as e:
+            logging.debug(e)
     file_path = "./data/wallets/{}/keystore".format(address)
     if not os.path.exists(file_path):
+        # fall back to an hd worker wallet derived from the seed
+        try:
+            addresses = json.load(open("{}/addresses.json".format(hd_wallet_folder)))
+        except (JSONDecodeError, FileNotFoundError):
+            addresses = {}
+        if address in addresses:
+            return derive_wallet(addresses[address], secret)
         raise FileNotFoundError("Can't find your wallet keystore for address: {}".format(address))
     keystore = "\n".join([line.strip() for line in open(file_path, 'r+')])
     private_key = web3.eth.account.decrypt(keystore, secret)
     return web3.eth.account.from_key(private_key)
 
 
+def load_hd_seed(secret):
+    keystore_file = "{}/keystore".format(hd_wallet_folder)
+    if not os.path.exists(keystore_file):
+        raise FileNotFoundError("Can't find an hd seed keystore at {}".format(keystore_file))
+    entropy = Account.decrypt(open(keystore_file).read(), secret)
+    return Mnemonic('english').to_mnemonic(entropy)
+
+
+def load_mint_gas():
+    try:
+        return json.load(open('./data/cache/mint_gas.json'))
+    except (JSONDecodeError, FileNotFoundError):
+        return {}
+
+
+def load_router_contract(router_name):
+    # routers come with their own abi, which load_contract doesn't cache, so keep one contract per router
+    if router_name not in router_contract_cache:
+        routers = json.load(open('./data/routers.json'))
+        router_contract_cache[router_name] = web3.eth.contract(address=routers[router_name][0], abi=routers[router_name][1])
+    return router_contract_cache[router_name]
+
+
+def load_strategy(name):
+    strategy = json.load(open('./data/strategies.json'))[name]
+    # recipients are named by their env variable so wallets stay in .env
+    strategy['recipient'] = os.getenv(strategy['recipient'], strategy['recipient'])
+    return strategy
+
+
 def log_end_loop(delay):
+    if profiler_thread:
+        profile_state['iterations'] += 1
+        if time.time() - profile_state['reported'] >= profile_report_seconds:
+            write_profile_report()
+        # the wait between iterations isn't part of the iteration
+        profile_state['paused'] = True
+    if memory_profile_state['name'] and time.time() - memory_profile_state['reported'] >= memory_profile_seconds:
+        write_memory_report()
+    if rpc_cache_stats := get_rpc_cache_stats():
+        logging.debug("RPC cache hit rates: eth_call {}%, eth_getBalance {}%".format(
+            rpc_cache_stats['eth_call_hit_rate'],
+            rpc_cache_stats['eth_getBalance_hit_rate']
+        ))
+    if rpc_budget_stats := get_rpc_budget_stats():
+        logging.debug("RPC budget: waited {}, moved {}, shed {}, throttled {}".format(
+            *[rpc_budget_stats.get(key, 0) for key in ('waited', 'moved', 'shed', 'throttled')]
+        ))
     if delay:
         logging.info("Waiting for {} seconds...".format(delay))
         time.sleep(delay)
     logging.info("-" * 50)
+    profile_state['paused'] = False
+
+
+def log_strategy_rates(strategy, signals, reference_rate):
+    quote_decimals = get_token_info(strategy['quote']['address'])['decimals']
+    for label, rate in [(signal['label'], signal['rate']) for signal in signals] + [(strategy['reference']['label'], reference_rate)]:
+        logging.info("{} Rate: 1 = {} {}".format(label, TokenAmount(rate, quote_decimals), strategy['quote']['label']))
+
+
+def minimize_abi(abi, names=None):
+    routes_functions = json.load(open('./data/routes.json'))
+    rng_functions = json.load(open('./data/rng.json'))
+    names = set(names or abi_fragment_names)
+    names.update(name.lstrip('#') for route in routes_functions.values() for name in route['functions'].values())
+    names.update(name for rng in rng_functions.values() for name in rng['functions'])
+    # custom errors stay so reverts can still be decoded
+    return [fragment for fragment in abi if fragment.get('name') in names or fragment['type'] == 'error']
+
+
+def mint_token(account, token_address, call_function, nonce=None, attempts=18):
+    rng_functions = json.load(open('./data/rng.json'))
+    token_contract = load_contract(token_address)
+    token_info = get_token_info(token_address)
+    try:
+        # building estimates gas, so a mint that would revert raises here
+        tx = getattr(token_contract.functions, call_function)().build_transaction({
+            "from": account.address,
+            "nonce": get_nonce(account.address) if nonce is None else nonce
+        })
+        tx_receipt = broadcast_transaction(account, tx, False, attempts, keep_nonce=nonce is not None)
+    except Exception as e:
+        if error := interpret_exception_message(e):
+            logging.error("{} to mint {}".format(error, rng_functions[token_address]['label']))
+        return False
+    else:
+        if tx_receipt:
+            record_mint_gas(account.address, token_address, call_function, tx_receipt)
+            logging.info("Called {} mint function for {} ({})".format(call_function, token_info['name'], token_info['symbol']))
+        else:
+            logging.warning(
+                "Failed to call {} mint function for {} ({})".format(call_function, token_info['name'], token_info['symbol']))
+        return tx_receipt
+
+
+def mint_token_at_nonce(account, token_address, call_function, nonce, attempts=18):
+    if tx_receipt := mint_token(account, token_address, call_function, nonce, attempts):
+        return tx_receipt
+    # a failed mint leaves a hole its in-flight siblings queue behind, so take its nonce with a 0 pls transfer right away
+    if not fill_nonce_gap(account, nonce, attempts):
+        logging.error("Could not fill nonce {}, later transactions are stuck behind it".format(nonce))
+    return False
 
 
 def mint_tokens(account, token_address, amount, attempts=18):
     rng_functions = json.load(open('./data/rng.json'))
     if token_address not in rng_functions:
         raise Exception("Mint/RNG function not available for {}".format(token_address))
-    call_function = random.choice(list(rng_functions[token_address]['functions']))
-    token_contract = load_contract(token_address, load_contract_abi(token_address))
-    token_info = get_token_info(token_address)
     loops = math.ceil(amount / rng_functions[token_address]['mints'])
     for i in list(range(0, loops)):
-        tx = getattr(token_contract.functions, call_function)().build_transaction({
-            "from": account.address,
-            "nonce": get_nonce(account.address)
-        })
+        if not mint_token(account, token_address, choose_mint_function(token_address), None, attempts):
+            return False
+    return True
+
+
+def mint_tokens_concurrently(account, token_amounts, max_in_flight=6, attempts=18):
+    rng_functions = json.load(open('./data/rng.json'))
+    mint_gas = load_mint_gas()
+    mints = {}
+    for token_address, amount in token_amounts.items():
+        if token_address not in rng_functions:
+            raise Exception("Mint/RNG function not available for {}".format(token_address))
+        mints[token_address] = math.ceil(amount / rng_functions[token_address]['mints'])
+    # interleave the contracts, cheapest gas per minted unit first, so each block gets a spread of mints
+    token_addresses = sorted(mints, key=lambda t: min(
+        [f['gas_per_mint'] for f in mint_gas.get(t, {}).values()] or [0]
+    ))
+    jobs = []
+    while any(mints.values()):
+        for token_address in token_addresses:
+            if mints[token_address]:
+                jobs.append((token_address, choose_mint_function(token_address, mint_gas)))
+                mints[token_address] -= 1
+    # hand out consecutive nonces so several mints can be in flight at once
+    nonce = get_nonce(account.address, block_identifier='pending')
+    minted = 0
+    for i in range(0, len(jobs), max_in_flight):
+        if get_mempool_gas_prices('rapid', gas_cache_seconds) > rapid_gas_fee_limit:
+            logging.warning("Gas fees are too high")
+            return None
+        batch = jobs[i:i + max_in_flight]
+        with ThreadPoolExecutor(max_workers=len(batch)) as executor:
+            results = list(executor.map(
+                lambda job: mint_token_at_nonce(account, job[1][0], job[1][1], nonce + job[0], attempts),
+                enumerate(batch)
+            ))
+        minted += len([result for result in results if result])
+        if not all(results):
+            logging.warning("Minted {} of {} batches before a mint failed".format(minted, len(jobs)))
+            return False
+        nonce += len(batch)
+    return True
+
+
+def multicall(calls, block_identifier='latest', attempts=18):
+    # one eth_call for many reads, failures come back per call instead of reverting the batch
+    multicall_contract = load_contract(multicall_address, json.load(open('./data/abi/Multicall3.json')))
+    while attempts > 0:
         try:
-            success = broadcast_transaction(account, tx, False, attempts)
+            return multicall_contract.functions.aggregate3(
+                [(address, True, call_data) for address, call_data in calls]
+            ).call(block_identifier=block_identifier)
         except Exception as e:
-            if error := interpret_exception_message(e):
-                logging.error("{} to mint {}".format(error, rng_functions[token_address]['label']))
-            return False
-        else:
-            if success:
-                logging.info("Called mint function for {} ({})".format(token_info['name'], token_info['symbol']))
+            logging.debug(e)
+            attempts -= 1
+            time.sleep(1)
+    return None
+
+
+def open_ledger():
+    global ledger_connection
+    if ledger_connection:
+        return ledger_connection
+    os.makedirs(os.path.dirname(ledger_file), exist_ok=True)
+    ledger_connection = sqlite3.connect(ledger_file, check_same_thread=False)
+    # amounts are stored as integer wei text, they don't fit sqlite integers and reals would round them
+    ledger_connection.executescript('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            hash TEXT PRIMARY KEY,
+            block INTEGER,
+            timestamp INTEGER,
+            strategy TEXT,
+            wallet TEXT,
+            to_address TEXT,
+            status INTEGER,
+            gas_used INTEGER,
+            gas_price TEXT,
+            gas_cost_wei TEXT,
+            value_wei TEXT
+        );
+        CREATE TABLE IF NOT EXISTS transfers (
+            hash TEXT,
+            log_index INTEGER,
+            token TEXT,
+            from_address TEXT,
+            to_address TEXT,
+            amount_wei TEXT,
+            PRIMARY KEY (hash, log_index)
+        );
+        CREATE TABLE IF NOT EXISTS totals (
+            strategy TEXT,
+            wallet TEXT,
+            token TEXT,
+            amount_in_wei TEXT DEFAULT '0',
+            amount_out_wei TEXT DEFAULT '0',
+            gas_cost_wei TEXT DEFAULT '0',
+            tx_count INTEGER DEFAULT 0,
+            PRIMARY KEY (strategy, wallet, token)
+        );
+        CREATE INDEX IF NOT EXISTS transactions_wallet ON transactions (wallet, timestamp);
+        CREATE INDEX IF NOT EXISTS transactions_strategy ON transactions (strategy, timestamp);
+        CREATE INDEX IF NOT EXISTS transactions_block ON transactions (block);
+        CREATE INDEX IF NOT EXISTS transfers_token ON transfers (token);
+        CREATE INDEX IF NOT EXISTS transfers_from ON transfers (from_address);
+        CREATE INDEX IF NOT EXISTS transfers_to ON transfers (to_address);
+    ''')
+    return ledger_connection
+
+
+def prefetch_contract_abis(addresses=None, minimize=False, max_workers=8, attempts=3):
+    addresses = addresses or get_abi_addresses()
+    missing = [address for address in addresses if not os.path.isfile("./data/abi/{}.json".format(address))]
+
+    def fetch(address):
+        try:
+            return get_abi_from_blockscout(address, attempts)
+        except Exception as e:
+            logging.debug(e)
+            return None
+
+    # fetch everything missing at once instead of one address at a time
+    results = {address: 'cached' for address in addresses}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as executor:
+        for address, abi in zip(missing, executor.map(fetch, missing)):
+            if abi:
+                open("./data/abi/{}.json".format(address), 'w').write(json.dumps(abi, indent=4))
+                results[address] = 'fetched'
             else:
-                logging.warning(
-                    "Failed to call mint function for {} ({})".format(token_info['name'], token_info['symbol']))
-                return False
-    return True
+                results[address] = 'missing'
+    for address in addresses:
+        if results[address] == 'missing':
+            continue
+        if minimize:
+            os.makedirs('./data/abi/minimized', exist_ok=True)
+            abi = minimize_abi(json.load(open("./data/abi/{}.json".format(address))))
+            open("./data/abi/minimized/{}.json".format(address), 'w').write(json.dumps(abi, indent=4))
+        abi_cache.pop(address, None)
+        contract_cache.pop(address, None)
+    return results
+
+
+def quote_from_reserves(amount_in, reserve_in, reserve_out, fee_percent=0.3):
+    if not amount_in or not reserve_in or not reserve_out:
+        return 0
+    amount_in_with_fee = amount_in * (100000 - int(fee_percent * 1000))
+    return amount_in_with_fee * reserve_out // (reserve_in * 100000 + amount_in_with_fee)
+
+
+def quote_swap_routes(router_routes, token0_amount, attempts=18):
+    calls = []
+    for router_name, token_route in router_routes:
+        router_contract = load_router_contract(router_name)
+        calls.append((router_contract.address, router_contract.encodeABI(fn_name='getAmountsOut', args=[token0_amount, token_route])))
+    # routes without a pool fail on their own, they just aren't candidates
+    results = multicall(calls, attempts=attempts) or [(False, b'')] * len(calls)
+    return [list(web3.codec.decode(['uint256[]'], return_data)[0]) if success else [] for success, return_data in results]
+
+
+def record_convert_gas(multi_address, call_function, iterations, tx_receipt):
+    # multi mints are measured per iteration, next to the rng functions
+    return update_mint_gas(multi_address, call_function, tx_receipt['gasUsed'] / iterations)
+
+
+def record_mint_gas(wallet_address, token_address, call_function, tx_receipt):
+    rng_functions = json.load(open('./data/rng.json'))
+    # count what was actually minted to the wallet, falling back to the configured amount per call
+    minted = sum(
+        int.from_bytes(log['data'][:32], 'big') for log in tx_receipt['logs']
+        if log['address'] == token_address and len(log['topics']) == 3
+        and log['topics'][0].hex() == transfer_event_topic
+        and int(log['topics'][1].hex(), 16) == 0
+        and int(log['topics'][2].hex(), 16) == int(wallet_address, 16)
+    )
+    if minted:
+        minted = from_token_decimals(minted, get_token_info(token_address)['decimals'])
+    else:
+        minted = rng_functions[token_address]['mints']
+    return update_mint_gas(token_address, call_function, tx_receipt['gasUsed'] / minted)
+
+
+def record_trade_inclusion(tx_receipt):
+    # approvals along the way aren't the trade landing
+    if not (trace := getattr(trade_trace_local, 'trace', None)) or 'approve' in trace['active']:
+        return
+    trace['inclusions'].append({
+        'hash': tx_receipt['transactionHash'].hex(),
+        'block': tx_receipt['blockNumber'],
+        'elapsed': round(time.time() - trace['started'], 6),
+        'blocks_behind': tx_receipt['blockNumber'] - trace['quote_block'] if trace['quote_block'] else None
+    })
 
 
+def record_transaction(wallet_address, tx, tx_receipt, strategy=None):
+    try:
+        strategy = strategy or ledger_strategy or wallet_address
+        gas_price = tx_receipt.get('effectiveGasPrice') or tx.get('gasPrice') or tx.get('maxFeePerGas') or 0
+        gas_cost = tx_receipt['gasUsed'] * gas_price
+        value = tx.get('value', 0)
+        # pls in and out of the wallet, plus erc20 transfers decoded from the receipt, all in wei so nothing is looked up here
+        totals = {'PLS': [0, value, gas_cost]}
+        transfers = []
+        for log in tx_receipt['logs']:
+            if not log['topics']:
+                continue
+            topic = log['topics'][0].hex()
+            if topic == transfer_event_topic and len(log['topics']) == 3:
+                from_address = web3.to_checksum_address(log['topics'][1][-20:])
+                to_address = web3.to_checksum_address(log['topics'][2][-20:])
+            elif topic == withdrawal_event_topic and log['address'] == "0xA1077a294dDE1B09bB078844df40758a5D0f9a27":
+                # router unwraps pay out pls to the swap's recipient, count it for the sending wallet
+                from_address, to_address = log['address'], wallet_address
+                totals['PLS'][0] += int.from_bytes(log['data'][:32], 'big')
+                continue
+            else:
+                continue
+            amount_wei = int.from_bytes(log['data'][:32], 'big')
+            transfers.append((
+                tx_receipt['transactionHash'].hex(),
+                log['logIndex'],
+                log['address'],
+                from_address,
+                to_address,
+                str(amount_wei)
+            ))
+            token_totals = totals.setdefault(log['address'], [0, 0, 0])
+            if to_address == wallet_address:
+                token_totals[0] += amount_wei
+            if from_address == wallet_address:
+                token_totals[1] += amount_wei
+        with ledger_lock:
+            ledger = open_ledger()
+            # commits or rolls back as one, so a failed write never leaves the transaction open
+            with ledger:
+                # hold the write lock from reading the totals to writing them back, other bots share the file
+                ledger.execute("BEGIN IMMEDIATE")
+                cursor = ledger.execute(
+                    "INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        tx_receipt['transactionHash'].hex(),
+                        tx_receipt['blockNumber'],
+                        int(time.time()),
+                        strategy,
+                        wallet_address,
+                        tx.get('to'),
+                        tx_receipt['status'],
+                        tx_receipt['gasUsed'],
+                        str(gas_price),
+                        str(gas_cost),
+                        str(value)
+                    )
+                )
+                # only roll the totals forward the first time a transaction is seen
+                if cursor.rowcount:
+                    ledger.executemany("INSERT OR IGNORE INTO transfers VALUES (?, ?, ?, ?, ?, ?)", transfers)
+                    for token, token_totals in totals.items():
+                        # sqlite math on wei overflows to floats, so the sums are done here
+                        row = ledger.execute(
+                            "SELECT amount_in_wei, amount_out_wei, gas_cost_wei, tx_count FROM totals WHERE strategy = ? AND wallet = ? AND token = ?",
+                            (strategy, wallet_address, token)
+                        ).fetchone() or (0, 0, 0, 0)
+                        ledger.execute(
+                            "INSERT OR REPLACE INTO totals VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (strategy, wallet_address, token, *[str(int(row[i]) + token_totals[i]) for i in range(3)], row[3] + 1)
+                        )
+    except Exception as e:
+        # the ledger must never get in the way of trading
+        logging.debug(e)
+        logging.warning("Failed to record TX in the ledger")
+
+
+def record_mempool_transaction(tx):
+    if tx.get('maxFeePerGas') is not None:
+        gas_price = int(tx['maxFeePerGas'], 16) if type(tx['maxFeePerGas']) is str else tx['maxFeePerGas']
+    elif tx.get('gasPrice') is not None:
+        gas_price = int(tx['gasPrice'], 16) if type(tx['gasPrice']) is str else tx['gasPrice']
+    else:
+        return
+    gas_price = gas_price / 10 ** 9
+    with mempool_gas_lock:
+        mempool_gas_samples.append((time.time(), gas_price))
+        insort(mempool_gas_sorted, gas_price)
+
+
+def request_signing_agent(request, socket_path=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path or signing_agent_socket)
+        client.sendall((json.dumps(request, default=lambda o: o.hex() if hasattr(o, 'hex') else str(o)) + "\n").encode())
+        response = b''
+        while not response.endswith(b"\n"):
+            if not (chunk := client.recv(65536)):
+                break
+            response += chunk
+    response = json.loads(response)
+    if 'error' in response:
+        raise Exception("Signing agent: {}".format(response['error']))
+    return response['result']
+
+
+def run_scheduled_actions():
+    with scheduler_lock:
+        actions = sorted(
+            scheduled_actions.values(),
+            key=lambda action: (gas_priority_classes[action['priority']]['rank'], action['deadline'])
+        )
+    if not actions:
+        return {}
+    gas_price = get_mempool_gas_prices('rapid', gas_cache_seconds)
+    if (block := get_block_number()) is None:
+        logging.warning("Could not read the block number, deferred {} scheduled actions".format(len(actions)))
+        return {action['key']: None for action in actions}
+    results = {}
+    for action in actions:
+        if time.time() > action['deadline']:
+            logging.warning("Dropped {} after waiting past its deadline".format(action['key']))
+            results[action['key']] = False
+        elif gas_price > get_gas_fee_limit(action['priority'], action['deadline']):
+            # too expensive for this priority, keep it queued for a cheaper block
+            results[action['key']] = None
+            continue
+        elif should_wait_for_cheaper_block(action, block):
+            results[action['key']] = None
+            continue
+        elif not claim_block_gas(block, action['gas'], action['priority']):
+            results[action['key']] = None
+            continue
+        else:
+            # one failing action is dropped without taking the rest of the queue with it
+            try:
+                results[action['key']] = action['function'](*action['args'], **action['kwargs'])
+            except Exception as e:
+                logging.error("{} failed: {}".format(action['key'], interpret_exception_message(e)))
+                results[action['key']] = False
+        # unfinished batches return none and stay queued to pick up where they stopped
+        if results[action['key']] is not None:
+            with scheduler_lock:
+                if scheduled_actions.get(action['key']) is action:
+                    del scheduled_actions[action['key']]
+    if deferred := list(results.values()).count(None):
+        logging.info("Deferred {} of {} scheduled actions at {} gwei".format(deferred, len(actions), gas_price))
+    return results
+
+
+@traced('sample')
 def sample_exchange_rate(router_name, token_address, quote_address, attempts=18):
+    # read the rate from indexed reserves when the pair is being watched
+    if pool_indexer_thread and (reserves := get_pool_reserves(router_name, token_address, quote_address)):
+        return quote_from_reserves(
+            10 ** get_token_info(token_address)['decimals'],
+            reserves[0],
+            reserves[1],
+            router_fee_percents.get(router_name, 0.3)
+        )
     while attempts > 0:
         token_result = estimate_swap_result(router_name, token_address, quote_address, 1)
         if len(token_result) == 0:
@@ -634,6 +2584,75 @@ def sample_exchange_rate(router_name, token_address, quote_address, attempts=18)
     return None
 
 
+@traced('sample')
+def sample_exchange_rates(router_name, token_addresses, quote_address, attempts=18):
+    rates = {}
+    # indexed reserves cost nothing, everything else is quoted together in one multicall
+    for token_address in token_addresses:
+        if pool_indexer_thread and (reserves := get_pool_reserves(router_name, token_address, quote_address)):
+            rates[token_address] = quote_from_reserves(
+                10 ** get_token_info(token_address)['decimals'],
+                reserves[0],
+                reserves[1],
+                router_fee_percents.get(router_name, 0.3)
+            )
+    if not (pending := [token_address for token_address in token_addresses if token_address not in rates]):
+        return rates
+    router_contract = load_router_contract(router_name)
+    results = multicall([(router_contract.address, router_contract.encodeABI(
+        fn_name='getAmountsOut',
+        args=[10 ** get_token_info(token_address)['decimals'], [token_address, quote_address]]
+    )) for token_address in pending], attempts=attempts)
+    for token_address, (success, return_data) in zip(pending, results or []):
+        rates[token_address] = web3.codec.decode(['uint256[]'], return_data)[0][-1] if success else None
+    return rates
+
+
+def sample_profile(thread_id):
+    while True:
+        time.sleep(profile_interval_seconds)
+        if profile_state['paused'] or not (frame := sys._current_frames().get(thread_id)):
+            continue
+        stack = []
+        while frame:
+            stack.append("{}:{}".format(os.path.basename(frame.f_code.co_filename), frame.f_code.co_name))
+            frame = frame.f_back
+        profile_samples[";".join(reversed(stack))] += 1
+
+
+def save_hd_addresses(indexed_accounts):
+    # remember which index each derived address came from so load_wallet can find it
+    addresses_file = "{}/addresses.json".format(hd_wallet_folder)
+    try:
+        addresses = json.load(open(addresses_file))
+    except (JSONDecodeError, FileNotFoundError):
+        addresses = {}
+    if any(addresses.get(account.address) != index for index, account in indexed_accounts):
+        addresses.update({account.address: index for index, account in indexed_accounts})
+        open(addresses_file, 'w').write(json.dumps(addresses, indent=4))
+
+
+def schedule_action(key, priority, function, *args, gas=None, deadline_seconds=None, **kwargs):
+    with scheduler_lock:
+        if action := scheduled_actions.get(key):
+            # coalesce repeated requests for the same work into the newest arguments, keeping its place in the queue
+            action.update({'function': function, 'args': args, 'kwargs': kwargs, 'gas': gas or action['gas']})
+            action['coalesced'] += 1
+        else:
+            action = scheduled_actions[key] = {
+                'key': key,
+                'priority': priority,
+                'function': function,
+                'args': args,
+                'kwargs': kwargs,
+                'gas': gas or scheduler_default_gas,
+                'queued': time.time(),
+                'deadline': time.time() + (deadline_seconds or scheduler_deadline_seconds),
+                'coalesced': 0
+            }
+    return action
+
+
 def send_pls(account, to_address, amount, attempts=18):
     tx = {
         'nonce': get_nonce(account.address),
@@ -649,6 +2668,27 @@ def send_pls(account, to_address, amount, attempts=18):
         return False
 
 
+def send_pls_multi(account, amounts, attempts=18):
+    if not (batch_contract := get_batch_executor(account.address)):
+        return {to_address: bool(send_pls(account, to_address, amount, attempts)) for to_address, amount in amounts.items()}
+    to_addresses = list(amounts.keys())
+    values = [to_token_decimals(amounts[to_address], 18) for to_address in to_addresses]
+    try:
+        tx = batch_contract.functions.multiSend(to_addresses, values).build_transaction({
+            'nonce': get_nonce(account.address),
+            'from': account.address,
+            'value': sum(values)
+        })
+        tx_receipt = broadcast_transaction(account, tx, True, attempts)
+    except Exception as e:
+        if error := interpret_exception_message(e):
+            logging.error("{}. Could not send to {}".format(error, ", ".join(to_addresses)))
+        return {to_address: False for to_address in to_addresses}
+    if not tx_receipt:
+        return {to_address: False for to_address in to_addresses}
+    return dict(zip(to_addresses, get_batch_results(batch_contract, tx_receipt)))
+
+
 def send_tokens(account, token_address, to_address, amount, attempts=18):
     token_contract = load_contract(token_address)
     token_info = get_token_info(token_address)
@@ -672,8 +2712,42 @@ def send_tokens(account, token_address, to_address, amount, attempts=18):
         return False
 
 
+def send_tokens_multi(account, token_address, amounts, attempts=18):
+    if not (batch_contract := get_batch_executor(account.address)):
+        return {
+            to_address: bool(send_tokens(account, token_address, to_address, amount, attempts))
+            for to_address, amount in amounts.items()
+        }
+    token_info = get_token_info(token_address)
+    to_addresses = list(amounts.keys())
+    values = [to_token_decimals(amounts[to_address], token_info['decimals']) for to_address in to_addresses]
+    approve_token_spending(account, token_address, batch_contract.address, sum(amounts.values()))
+    try:
+        tx = batch_contract.functions.multiTransfer(token_address, to_addresses, values).build_transaction({
+            'nonce': get_nonce(account.address),
+            'from': account.address
+        })
+        tx_receipt = broadcast_transaction(account, tx, True, attempts)
+    except Exception as e:
+        if error := interpret_exception_message(e):
+            logging.error("{}. Could not send {} ({}) to {}".format(
+                error,
+                token_info['name'],
+                token_info['symbol'],
+                ", ".join(to_addresses)
+            ))
+        return {to_address: False for to_address in to_addresses}
+    if not tx_receipt:
+        return {to_address: False for to_address in to_addresses}
+    return dict(zip(to_addresses, get_batch_results(batch_contract, tx_receipt)))
+
+
 def set_logging(filename='app', level='INFO', backup_count=7):
     if hasattr(logging, level.upper()):
+        if profile_enabled:
+            start_profiler(filename)
+        if memory_profile_enabled:
+            start_memory_profiler(filename)
         os.makedirs('./data/logs/', exist_ok=True)
         logging.basicConfig(
             format='%(asctime)s %(name)s %(levelname)s %(message)s',
@@ -693,68 +2767,281 @@ def set_logging(filename='app', level='INFO', backup_count=7):
     raise Exception("Invalid logging level")
 
 
+def set_ledger_strategy(strategy):
+    global ledger_strategy
+    ledger_strategy = strategy
+    return ledger_strategy
+
+
+def should_wait_for_cheaper_block(action, block):
+    if not gas_priority_classes[action['priority']].get('deferrable') or not gas_forecast_blocks:
+        return False
+    # wait for a predicted drop once, then run at the chosen block whatever the new forecast says
+    if action.get('wait_until'):
+        return block < action['wait_until']
+    if action['deadline'] - time.time() <= scheduler_escalate_seconds:
+        return False
+    if not (window := get_cheapest_fee_window()):
+        return False
+    if window['wait_blocks'] == 0 or window['savings_percent'] < gas_forecast_min_savings_percent:
+        return False
+    action['wait_until'] = window['block']
+    logging.info("Waiting {} blocks to {} for a {:.1f}% cheaper base fee".format(window['wait_blocks'], action['key'], window['savings_percent']))
+    return True
+
+
+@traced('sign')
+def sign_fee_ladder(account, tx, steps=None, multiplier=None):
+    steps = steps or fee_ladder_steps
+    multiplier = multiplier or fee_ladder_multiplier
+    fee_ladder = []
+    for level in range(0, steps):
+        _tx = dict(tx)
+        for fee_key in ('maxFeePerGas', 'maxPriorityFeePerGas', 'gasPrice'):
+            if fee_key in _tx:
+                _tx[fee_key] = int(_tx[fee_key] * multiplier ** level)
+        fee_ladder.append(_tx)
+    return sign_transactions(account, fee_ladder)
+
+
+def sign_transactions(account, txs):
+    if account.key is not None:
+        return [web3.eth.account.sign_transaction(tx, private_key=account.key) for tx in txs]
+    # accounts held by the signing agent get the whole batch signed in one round trip
+    signed_txs = request_signing_agent({'method': 'sign', 'address': account.address, 'transactions': txs})
+    return [
+        SimpleNamespace(rawTransaction=HexBytes(signed_tx['raw']), hash=HexBytes(signed_tx['hash']))
+        for signed_tx in signed_txs
+    ]
+
+
+@traced('simulate')
+def simulate_transaction(tx, block_identifier='pending'):
+    call = {key: tx[key] for key in ('from', 'to', 'value', 'data') if key in tx}
+    try:
+        web3.eth.call(call, block_identifier)
+    except ContractLogicError as e:
+        return interpret_revert_reason(e)
+    except ValueError as e:
+        # node-side rejections such as not enough pls for the value
+        if type(e.args[0]) is dict and 'message' in e.args[0]:
+            return interpret_revert_reason(e.args[0]['message'])
+        logging.debug(e)
+    except Exception as e:
+        # an unreachable rpc shouldn't block the broadcast, it has its own retries
+        logging.debug(e)
+    return None
+
+
+def start_memory_profiler(name='app'):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(memory_profile_frames)
+    memory_profile_state.update({'name': name, 'reported': time.time(), 'rss': get_rss()})
+    memory_profile_state['sites'] = summarize_memory_snapshot(tracemalloc.take_snapshot())
+    return memory_profile_state
+
+
+def start_pool_indexer(router_name, token_pairs, poll_interval=3):
+    global pool_indexer_thread
+    if pool_indexer_thread and pool_indexer_thread.is_alive():
+        return pool_indexer_thread
+    pair_addresses = [get_pair_address(router_name, *token_pair) for token_pair in token_pairs]
+    pair_addresses = [pair_address for pair_address in pair_addresses if pair_address]
+    # resume from the last checkpoint so a restart only replays the blocks it missed
+    try:
+        with pool_state_lock:
+            pool_state.update(json.load(open(pool_state_file)))
+    except (JSONDecodeError, FileNotFoundError):
+        pass
+    index_pool_state(pair_addresses)
+    pool_indexer_thread = threading.Thread(
+        target=watch_pool_state,
+        args=(pair_addresses, poll_interval),
+        name='pool-indexer',
+        daemon=True
+    )
+    pool_indexer_thread.start()
+    return pool_indexer_thread
+
+
+def start_profiler(name='app'):
+    global profiler_thread
+    if profiler_thread and profiler_thread.is_alive():
+        return profiler_thread
+    profile_state.update({'name': name, 'reported': time.time()})
+    profiler_thread = threading.Thread(
+        target=sample_profile,
+        args=(threading.main_thread().ident,),
+        name='profiler',
+        daemon=True
+    )
+    profiler_thread.start()
+    return profiler_thread
+
+
+def start_trade_trace(kind):
+    end_trade_trace()
+    if not trade_trace_enabled:
+        return None
+    trace = {'id': uuid4().hex, 'kind': kind, 'started': time.time(), 'quote_block': None, 'inclusions': [], 'spans': [], 'active': []}
+    try:
+        trace['quote_block'] = web3.eth.block_number
+    except Exception as e:
+        logging.debug(e)
+    trade_trace_local.trace = trace
+    return trace['id']
+
+
+def start_mempool_gas_feed(ws_url=None):
+    global mempool_feed_thread
+    if mempool_feed_thread and mempool_feed_thread.is_alive():
+        return mempool_feed_thread
+    mempool_feed_thread = threading.Thread(
+        target=watch_pending_transactions,
+        args=(ws_url or mempool_feed_ws_url,),
+        name='mempool-gas-feed',
+        daemon=True
+    )
+    mempool_feed_thread.start()
+    return mempool_feed_thread
+
+
+def start_rpc_keepalive():
+    global rpc_keepalive_thread
+    if rpc_keepalive_thread and rpc_keepalive_thread.is_alive():
+        return rpc_keepalive_thread
+    # unwrap the cache and recorder down to the endpoints, replays have none to keep warm
+    provider = web3.provider
+    while not isinstance(provider, TransportMultiProvider):
+        if not (provider := getattr(provider, 'provider', None)):
+            return None
+    rpc_keepalive_thread = threading.Thread(target=provider.keep_warm, name='rpc-keepalive', daemon=True)
+    rpc_keepalive_thread.start()
+    return rpc_keepalive_thread
+
+
+def summarize_memory_snapshot(snapshot):
+    root = os.getcwd()
+    sites = {}
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ))
+    # leave out what the memory reports themselves hold on to
+    own_lines = [
+        (function.__code__.co_firstlineno, max(line for _, _, line in function.__code__.co_lines() if line))
+        for function in (summarize_memory_snapshot, write_memory_report)
+    ]
+
+    def name_frame(frame):
+        if frame.filename.startswith(root):
+            return "{}:{}".format(os.path.relpath(frame.filename, root), frame.lineno)
+        return "{}:{}".format(frame.filename.split('site-packages/')[-1].split('/lib/')[-1], frame.lineno)
+
+    for stat in snapshot.statistics('traceback'):
+        frames = list(stat.traceback)
+        if any(frame.filename == __file__ and first <= frame.lineno <= last for frame in frames for first, last in own_lines):
+            continue
+        site = name_frame(frames[-1])
+        # name the bot code behind allocations made inside libraries
+        callers = [frame for frame in reversed(frames) if frame.filename.startswith(root)]
+        if callers and callers[0] != frames[-1]:
+            site += " via {}".format(name_frame(callers[0]))
+        size, count = sites.get(site, (0, 0))
+        sites[site] = (size + stat.size, count + stat.count)
+    return sites
+
+
+def summarize_gas_prices(gas_prices):
+    very_slow = gas_prices[int(len(gas_prices) * 0.1)]  # 10th percentile
+    slow = gas_prices[int(len(gas_prices) * 0.25)]  # 25th percentile
+    standard = gas_prices[int(len(gas_prices) * 0.5)]  # 50th percentile (median)
+    fast = gas_prices[int(len(gas_prices) * 0.70)]  # 70th percentile
+    rapid = gas_prices[int(len(gas_prices) * 0.80)]  # 80th percentile
+    instant = gas_prices[int(len(gas_prices) * 0.90)]  # 90th percentile
+    return {
+        'very_slow': float(round(very_slow, 2)),
+        'slow': float(round(slow, 2)),
+        'standard': float(round(standard, 2)),
+        'fast': float(round(fast, 2)),
+        'rapid': float(round(rapid, 2)),
+        'instant': float(round(instant, 2)),
+        'avg': float(round(mean(gas_prices), 2)),
+        'median': float(round(median(gas_prices), 2)),
+        'lowest': float(round(min(gas_prices), 2)),
+        'highest': float(round(max(gas_prices), 2)),
+        'tx_count': len(gas_prices),
+        'timestamp': time.time()
+    }
+
+
+@traced('swap')
 def swap_tokens(account, router_name, token_route, estimated_swap_result, slippage_percent, to_address=None, taxed=False, attempts=18):
-    routers = json.load(open('./data/routers.json'))
-    router_contract = load_contract(routers[router_name][0], routers[router_name][1])
-    approve_token_spending(account, token_route[0], routers[router_name][0], estimated_swap_result[0])
-    if token_route[-1] == "0xA1077a294dDE1B09bB078844df40758a5D0f9a27":
-        tx = router_contract.functions.swapExactTokensForETH(
-            estimated_swap_result[0],
-            estimated_swap_result[1] - round(estimated_swap_result[1] * (slippage_percent / 100)),
-            token_route,
-            to_address or account.address,
-            int(time.time()) + (60 * 3)
-        )
-        tx_params = {
-            "from": account.address,
-            "nonce": get_nonce(account.address)
-        }
-    elif token_route[0] == "0xA1077a294dDE1B09bB078844df40758a5D0f9a27":
-        if taxed:
-            swap_function = router_contract.functions.swapExactETHForTokensSupportingFeeOnTransferTokens
-        else:
-            swap_function = router_contract.functions.swapExactETHForTokens
-        tx = swap_function(
-            0,
-            token_route,
-            to_address or account.address,
-            int(time.time()) + (60 * 3)
-        )
-        tx_params = {
-            "from": account.address,
-            "nonce": get_nonce(account.address),
-            "value": estimated_swap_result[0]
-        }
-    else:
-        if taxed:
-            swap_function = router_contract.functions.swapExactTokensForETHSupportingFeeOnTransferTokens
-        else:
-            swap_function = router_contract.functions.swapExactTokensForETH
-        tx = swap_function(
-            estimated_swap_result[0],
-            estimated_swap_result[1] - (estimated_swap_result[1] * slippage_percent),
-            token_route,
-            to_address or account.address,
-            int(time.time()) + (60 * 3)
-        )
-        tx_params = {
-            "from": account.address,
-            "nonce": get_nonce(account.address)
-        }
+    router_contract = load_router_contract(router_name)
+    approve_token_spending(account, token_route[0], router_contract.address, estimated_swap_result[0])
     try:
-        tx = tx.build_transaction(tx_params)
-        return broadcast_transaction(account, tx, True, attempts)
+        # simulate before broadcasting and re-plan once with a fresh quote and deadline on slippage or expiry
+        for replan in (False, True):
+            if replan:
+                logging.warning("{}. Re-quoting swap".format(revert['reason']))
+                estimated_swap_result = router_contract.functions.getAmountsOut(estimated_swap_result[0], token_route).call()
+            try:
+                tx = build_swap_transaction(account, router_contract, token_route, estimated_swap_result, slippage_percent, to_address, taxed)
+            except ContractLogicError as e:
+                revert = interpret_revert_reason(e)
+            else:
+                revert = simulate_transaction(tx)
+            if not revert or revert['category'] not in ('slippage', 'deadline'):
+                break
+        if revert:
+            logging.error("{}. Dropped swap that would revert: {}".format(revert['reason'], revert['category']))
+            return False
+        return broadcast_transaction(account, tx, True, attempts, False)
     except Exception as e:
         if error := interpret_exception_message(e):
             logging.error("{}. Failed to swap".format(error))
         return False
 
 
+def swap_with_strategy(account, strategy, token0_address, token1_address, amount):
+    if not (best_swap := find_best_swap(token0_address, token1_address, amount)):
+        logging.warning("No estimated swap result data")
+        return None
+    # swaps always get through, claiming their gas leaves less of the block for deferrable work
+    if (block := get_block_number()) is not None:
+        claim_block_gas(block, swap_gas_base + swap_gas_per_hop * (len(best_swap['route']) - 1), 'swap')
+    return swap_tokens(
+        account,
+        best_swap['router'],
+        best_swap['route'],
+        best_swap['amounts'],
+        strategy['slippage_percent'],
+        strategy['recipient']
+    )
+
+
+def to_decimal(amount):
+    if isinstance(amount, Decimal):
+        return amount
+    if isinstance(amount, TokenAmount):
+        return amount.units
+    # floats go through their shortest repr so 0.1 stays 0.1 instead of its binary expansion
+    return Decimal(repr(amount) if isinstance(amount, float) else amount)
+
+
 def to_token_decimals(amount, decimals):
-    amount = str(amount)
-    if '.' in amount:
-        decimals -= len(str(amount).split('.')[1])
-    return int(str(amount).replace('.', '') + '0' * decimals)
+    return units_to_wei(amount, decimals)
+
+
+def units_to_wei(amount, decimals):
+    if isinstance(amount, int):
+        return amount * 10 ** decimals
+    if isinstance(amount, TokenAmount) and amount.decimals == decimals:
+        return amount.wei
+    # shift the exponent in the exact context and truncate whatever falls below one wei
+    return int(wei_context.scaleb(to_decimal(amount), decimals))
 
 
 def unwrap_pls(account, amount, attempts=18):
@@ -771,6 +3058,188 @@ def unwrap_pls(account, amount, attempts=18):
         return False
 
 
+def update_mint_gas(address, call_function, gas_per_mint):
+    with mint_gas_lock:
+        mint_gas = load_mint_gas()
+        measured = mint_gas.setdefault(address, {}).setdefault(call_function, {'gas_per_mint': gas_per_mint, 'samples': 0})
+        # exponential moving average so the estimate follows changes in the contracts' costs
+        measured['gas_per_mint'] = measured['gas_per_mint'] * 0.8 + gas_per_mint * 0.2 if measured['samples'] else gas_per_mint
+        measured['samples'] += 1
+        os.makedirs('./data/cache/', exist_ok=True)
+        open('./data/cache/mint_gas.json', 'w').write(json.dumps(mint_gas, indent=4))
+    return measured['gas_per_mint']
+
+
+def watch_pool_state(pair_addresses, poll_interval=3):
+    while True:
+        try:
+            index_pool_state(pair_addresses)
+        except Exception as e:
+            logging.debug(e)
+        time.sleep(poll_interval)
+
+
+def watch_pending_transactions(ws_url=None, poll_interval=1):
+    while True:
+        if ws_url:
+            try:
+                asyncio.run(watch_pending_transactions_ws(ws_url))
+            except Exception as e:
+                logging.debug(e)
+                logging.warning("Mempool websocket feed dropped, polling pending transactions")
+        try:
+            watch_pending_transactions_poll(poll_interval, 60 if ws_url else None)
+        except Exception as e:
+            logging.debug(e)
+            time.sleep(poll_interval)
+
+
+async def watch_pending_transactions_ws(ws_url):
+    async with websockets.connect(ws_url, max_size=2 ** 24) as ws:
+        # ask for full transactions, nodes that ignore the flag send hashes which are looked up on the same socket
+        await ws.send(json.dumps({
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "eth_subscribe",
+            "params": ["newPendingTransactions", True]
+        }))
+        request_id = 1
+        async for message in ws:
+            message = json.loads(message)
+            if 'params' in message:
+                result = message['params']['result']
+            elif type(message.get('result')) is dict:
+                result = message['result']
+            else:
+                continue
+            if type(result) is dict:
+                record_mempool_transaction(result)
+            else:
+                request_id += 1
+                await ws.send(json.dumps({
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "method": "eth_getTransactionByHash",
+                    "params": [result]
+                }))
+
+
+def watch_pending_transactions_poll(poll_interval=1, duration=None, max_lookups=mempool_poll_lookups):
+    started = time.time()
+    pending_filter = web3.eth.filter('pending')
+    while not duration or time.time() - started < duration:
+        tx_hashes = pending_filter.get_new_entries()
+        # a random sample keeps the fee percentiles fair without a lookup per pending tx
+        for tx_hash in random.sample(tx_hashes, min(max_lookups, len(tx_hashes))):
+            try:
+                record_mempool_transaction(web3.eth.get_transaction(tx_hash))
+            except Exception as e:
+                logging.debug(e)
+        time.sleep(poll_interval)
+
+
+def write_memory_report(top=15):
+    memory_profile_state['reported'] = time.time()
+    gc.collect()
+    sites = summarize_memory_snapshot(tracemalloc.take_snapshot())
+    previous, memory_profile_state['sites'] = memory_profile_state['sites'] or {}, sites
+    growth = memory_profile_state['growth']
+    diffs = []
+    for site in set(sites) | set(previous):
+        size, count = sites.get(site, (0, 0))
+        size_diff = size - previous.get(site, (0, 0))[0]
+        diffs.append((size_diff, size, count - previous.get(site, (0, 0))[1], site))
+        # count how many reports in a row each site kept growing
+        if size_diff > 0:
+            growth[site] += 1
+        else:
+            growth.pop(site, None)
+    diffs.sort(reverse=True)
+    flagged = sorted(
+        ((count, sites[site][0], site) for site, count in growth.items() if count >= memory_growth_reports),
+        reverse=True
+    )
+
+    # web3 builds a class per contract, so count both along with the caches that live as long as the process
+    objects = gc.get_objects()
+    type_counts = Counter(type(o).__name__ for o in objects)
+    counts = {
+        'contracts': sum(1 for o in objects if isinstance(o, Contract)),
+        'contract_classes': sum(1 for o in objects if isinstance(o, type) and issubclass(o, Contract)),
+        'abi_cache': len(abi_cache),
+        'contract_cache': len(contract_cache),
+        'router_contract_cache': len(router_contract_cache),
+        'pool_pairs': len(pool_state['pairs']),
+        'mempool_gas_samples': len(mempool_gas_samples),
+        'profile_samples': len(profile_samples),
+        'hd_accounts': len(hd_wallet_state['accounts'])
+    }
+    del objects
+    rss = get_rss()
+    traced, traced_peak = tracemalloc.get_traced_memory()
+
+    report = ["RSS {:.1f} MB ({:+.1f} MB since start), traced {:.1f} MB, traced peak {:.1f} MB".format(
+        rss / 2 ** 20,
+        (rss - memory_profile_state['rss']) / 2 ** 20,
+        traced / 2 ** 20,
+        traced_peak / 2 ** 20
+    )]
+    report.append("\nGrowing for {}+ reports in a row".format(memory_growth_reports))
+    report.extend("{:>7} {:>10.1f} KB  {}".format(count, size / 1024, site) for count, size, site in flagged[:top])
+    report.append("\n{:>10} {:>10} {:>8}  {}".format('KB diff', 'KB', 'Count +', 'Site'))
+    report.extend(
+        "{:>+10.1f} {:>10.1f} {:>+8}  {}".format(size_diff / 1024, size / 1024, count_diff, site)
+        for size_diff, size, count_diff, site in diffs[:top]
+    )
+    report.append("\n{:>10}  {}".format('Count', 'Object'))
+    report.extend("{:>10}  {}".format(count, name) for name, count in counts.items())
+    report.extend("{:>10}  {}".format(count, name) for name, count in type_counts.most_common(top))
+    os.makedirs('./data/logs/', exist_ok=True)
+    file_path = "./data/logs/{}.memory".format(memory_profile_state['name'])
+    open("{}.txt".format(file_path), 'w').write("\n".join(report) + "\n")
+    # one compact line per report to follow the trend over days
+    open("{}.jsonl".format(file_path), 'a').write(json.dumps({
+        'time': int(memory_profile_state['reported']),
+        'rss': rss,
+        'traced': traced,
+        'counts': counts,
+        'growing': {site: count for count, size, site in flagged[:top]}
+    }) + "\n")
+    for count, size, site in flagged[:3]:
+        logging.warning("Memory at {} grew for {} reports in a row ({:.1f} KB)".format(site, count, size / 1024))
+    return file_path
+
+
+def write_profile_report(top=25):
+    profile_state['reported'] = time.time()
+    samples = dict(profile_samples)
+    if not (total := sum(samples.values())):
+        return None
+    os.makedirs('./data/logs/', exist_ok=True)
+    file_path = "./data/logs/{}.profile".format(profile_state['name'])
+    # collapsed stacks, ready for flamegraph.pl or speedscope
+    open("{}.collapsed".format(file_path), 'w').write(
+        "".join("{} {}\n".format(stack, count) for stack, count in sorted(samples.items()))
+    )
+    self_counts, total_counts = Counter(), Counter()
+    for stack, count in samples.items():
+        functions = stack.split(";")
+        self_counts[functions[-1]] += count
+        for function in set(functions):
+            total_counts[function] += count
+    report = ["{} samples over {} iterations, {}ms interval".format(
+        total,
+        profile_state['iterations'],
+        int(profile_interval_seconds * 1000)
+    )]
+    for title, counts in (('Self', self_counts), ('Total', total_counts)):
+        report.append("\n{:>7} {:>7}  {}".format(title, '%', 'Function'))
+        for function, count in counts.most_common(top):
+            report.append("{:>7} {:>6.2f}%  {}".format(count, count / total * 100, function))
+    open("{}.txt".format(file_path), 'w').write("\n".join(report) + "\n")
+    return file_path
+
+
 def wrap_pls(account, amount, attempts=18):
     wpls_contract = load_contract("0xA1077a294dDE1B09bB078844df40758a5D0f9a27")
     try:
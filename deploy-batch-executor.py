@@ -0,0 +1,39 @@
+from core import *
+
+# show help
+if len(sys.argv) < 2 or 'help' == sys.argv[1].lower():
+    print("Deploys a batch executor for a wallet so repeated conversions and transfers are sent in one transaction.")
+    print("Compiles contracts/BatchExecutor.sol with py-solc-x unless a compiled bytecode file is given.")
+    print("py-solc-x is only in requirements-dev.txt, install it with: pip install -r requirements-dev.txt\n")
+    print("Example Usage:")
+    command = "python {}".format(sys.argv[0])
+    examples = ['0x1234567891234567891234567891234567891234', '0x1234567891234567891234567891234567891234 BatchExecutor.bin']
+    for e in examples:
+        print("{} {}".format(command, e))
+    sys.exit()
+
+try:
+    wallet_address = web3.to_checksum_address(sys.argv[1])
+except ValueError:
+    print("Invalid wallet address {}".format(sys.argv[1]))
+    sys.exit()
+
+# load the compiled bytecode or compile it
+if len(sys.argv) > 2:
+    bytecode = open(sys.argv[2]).read().strip()
+else:
+    try:
+        import solcx
+    except ImportError:
+        print("Install py-solc-x (pip install -r requirements-dev.txt) or pass a compiled bytecode file")
+        sys.exit()
+    solcx.install_solc('0.8.19')
+    compiled = solcx.compile_files(['./contracts/BatchExecutor.sol'], output_values=['bin'], solc_version='0.8.19')
+    bytecode = compiled['contracts/BatchExecutor.sol:BatchExecutor']['bin']
+
+set_logging(wallet_address, 'INFO')
+account = load_wallet(wallet_address, os.getenv('SECRET'))
+if batch_executor_address := deploy_batch_executor(account, bytecode):
+    logging.info("Deployed batch executor for {} to {}".format(wallet_address, batch_executor_address))
+else:
+    logging.warning("Failed to deploy batch executor for {}".format(wallet_address))
@@ -5,7 +5,15 @@ if 'help' == sys.argv[1].lower():
     print("Generates 1 or more number of wallet keystores and optionally displays their private keys.\n")
     print("Example Usage:")
     command = "python {}".format(sys.argv[0])
-    examples = ['--create', '--create 1', '--create 1 --show-private-keys', '--show-private-keys 0x1234567891234567891234567891234567891234']
+    examples = [
+        '--create',
+        '--create 1',
+        '--create 1 --show-private-keys',
+        '--show-private-keys 0x1234567891234567891234567891234567891234',
+        '--hd-create',
+        '--hd-derive 0-199',
+        '--hd-derive 5 --show-private-keys'
+    ]
     for e in examples:
         print("{} {}".format(command, e))
     sys.exit()
@@ -50,8 +58,38 @@ if "--create" in sys.argv or "-c" in sys.argv:
 else:
     amount = 0
 
+# create an hd seed that worker wallets are derived from
+if "--hd-create" in sys.argv:
+    try:
+        mnemonic = generate_hd_seed(secret)
+    except FileExistsError as e:
+        print(e)
+    else:
+        print("\nGenerated hd seed, write down the mnemonic to recover the derived wallets\n")
+        print("Mnemonic: {}\n".format(mnemonic))
+
+# derive a range of hd worker wallets
+elif "--hd-derive" in sys.argv:
+    try:
+        index_range = sys.argv[sys.argv.index("--hd-derive") + 1].split('-')
+        start = int(index_range[0])
+        end = int(index_range[-1])
+    except (IndexError, ValueError):
+        print("Invalid index range")
+        sys.exit()
+    try:
+        wallets = derive_wallets(start, end - start + 1, secret)
+    except FileNotFoundError as e:
+        print(e)
+        sys.exit()
+    print("\nDerived {} wallets\n".format(len(wallets)))
+    for index, wallet in enumerate(wallets, start):
+        print("Index {} Public Key: {}".format(index, wallet.address))
+        if show_private_key:
+            print("Private Key: {}\n".format(wallet.key.hex()))
+
 # create new wallets
-if amount:
+elif amount:
     # generate X wallets based on sys.argv
     wallets = generate_wallet(int(amount))
     print("\nGenerated {} wallets\n".format(amount))
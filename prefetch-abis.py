@@ -0,0 +1,36 @@
+from core import *
+
+# show help
+if len(sys.argv) > 1 and 'help' == sys.argv[1].lower():
+    print("Fetches the abis of every contract in routes.json, rng.json and strategies.json from Blockscout at once.")
+    print("Minimized abis keep only the functions and events the bots call and are preferred when loading contracts.")
+    print("Set BLOCKSCOUT_API_URL to fetch from another Blockscout instance.\n")
+    print("Example Usage:")
+    command = "python {}".format(sys.argv[0])
+    examples = ['', '--minimize', '--workers 16', '0x24F0154C1dCe548AdF15da2098Fdd8B8A3B8151D']
+    for e in examples:
+        print("{} {}".format(command, e))
+    sys.exit()
+
+# number of abis fetched at the same time
+max_workers = 8
+if "--workers" in sys.argv:
+    try:
+        max_workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    except (IndexError, ValueError):
+        print("Invalid number of workers")
+        sys.exit()
+
+# fetch only the given addresses, otherwise everything the configs reference
+addresses = [arg for arg in sys.argv[1:] if arg.startswith('0x')]
+
+started = time.time()
+results = prefetch_contract_abis(addresses, "--minimize" in sys.argv, max_workers)
+for address, status in results.items():
+    print("{} {}".format(address, status))
+print("\n{} cached, {} fetched, {} missing in {:.2f} seconds".format(
+    list(results.values()).count('cached'),
+    list(results.values()).count('fetched'),
+    list(results.values()).count('missing'),
+    time.time() - started
+))
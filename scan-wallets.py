@@ -0,0 +1,69 @@
+from core import *
+
+# show help
+if len(sys.argv) > 1 and 'help' == sys.argv[1].lower():
+    print("Scans the PLS and token balances of every wallet in data/wallets in a few batched multicalls.")
+    print("Tokens default to everything in data/tokens, pass --tokens to scan others.\n")
+    print("Example Usage:")
+    command = "python {}".format(sys.argv[0])
+    examples = [
+        '',
+        '--json',
+        '--workers 16',
+        '--tokens 0x24F0154C1dCe548AdF15da2098Fdd8B8A3B8151D,0x6B175474E89094C44Da98b954EedeAC495271d0F',
+        '0x1234567891234567891234567891234567891234'
+    ]
+    for e in examples:
+        print("{} {}".format(command, e))
+    sys.exit()
+
+# number of multicall chunks read at the same time
+max_workers = 8
+if "--workers" in sys.argv:
+    try:
+        max_workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    except (IndexError, ValueError):
+        print("Invalid number of workers")
+        sys.exit()
+
+# only scan the given tokens
+token_addresses = None
+if "--tokens" in sys.argv:
+    try:
+        token_addresses = [Web3.to_checksum_address(a) for a in sys.argv[sys.argv.index("--tokens") + 1].split(',')]
+    except (IndexError, ValueError):
+        print("Invalid token addresses")
+        sys.exit()
+
+# scan only the given wallets, otherwise every local one
+wallet_addresses = [
+    Web3.to_checksum_address(arg) for i, arg in enumerate(sys.argv[1:], 1)
+    if arg.startswith('0x') and sys.argv[i - 1] != '--tokens'
+] or get_wallet_addresses()
+if not wallet_addresses:
+    print("No wallets found in data/wallets")
+    sys.exit()
+
+started = time.time()
+balances = get_wallet_balances(wallet_addresses, token_addresses, max_workers)
+columns = list(next(iter(balances.values())).keys())
+labels = ['PLS' if column == 'PLS' else get_token_info(column)['symbol'] for column in columns]
+
+# print as json for other tools
+if "--json" in sys.argv:
+    print(json.dumps({
+        wallet_address: {
+            column: str(amount) if amount is not None else None
+            for column, amount in wallet_balances.items()
+        } for wallet_address, wallet_balances in balances.items()
+    }, indent=4))
+    sys.exit()
+
+print("{:<42} {}".format('Address', ' '.join("{:>20}".format(label) for label in labels)))
+for wallet_address, wallet_balances in balances.items():
+    print("{:<42} {}".format(wallet_address, ' '.join(
+        "{:>20.4f}".format(amount) if amount is not None else "{:>20}".format('-') for amount in wallet_balances.values()
+    )))
+totals = [sum(b[column] for b in balances.values() if b[column] is not None) for column in columns]
+print("{:<42} {}".format('Total', ' '.join("{:>20.4f}".format(to_decimal(total)) for total in totals)))
+print("\nScanned {} wallets and {} tokens in {:.2f} seconds".format(len(balances), len(columns) - 1, time.time() - started))
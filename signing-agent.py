@@ -0,0 +1,93 @@
+from core import *
+import socketserver
+import struct
+
+# show help
+if len(sys.argv) > 1 and 'help' == sys.argv[1].lower():
+    print("Decrypts wallet keystores once and signs transactions for local bots over a unix socket.")
+    print("Set SIGNING_AGENT_SOCKET in .env for the bots to sign through the agent.\n")
+    print("Example Usage:")
+    command = "python {}".format(sys.argv[0])
+    examples = ['', '--hd 0-199']
+    for e in examples:
+        print("{} {}".format(command, e))
+    sys.exit()
+
+# make sure you have a unique secrets
+secret = os.getenv('SECRET')
+if secret == 'changeme' or not secret:
+    print('Change your secret in .env')
+    sys.exit()
+
+socket_path = signing_agent_socket or './data/agent.sock'
+set_logging('signing-agent', 'INFO')
+
+# clear a stale socket before loading so load_wallet decrypts the keystores itself
+if os.path.exists(socket_path):
+    os.remove(socket_path)
+
+# decrypt every keystore once
+accounts = {}
+for address in sorted(os.listdir('./data/wallets')) if os.path.isdir('./data/wallets') else []:
+    if os.path.isfile("./data/wallets/{}/keystore".format(address)):
+        accounts[address] = load_wallet(address, secret)
+
+# derive a range of hd worker wallets
+if "--hd" in sys.argv:
+    try:
+        index_range = sys.argv[sys.argv.index("--hd") + 1].split('-')
+        start = int(index_range[0])
+        end = int(index_range[-1])
+    except (IndexError, ValueError):
+        print("Invalid index range")
+        sys.exit()
+    for account in derive_wallets(start, end - start + 1, secret):
+        accounts[account.address] = account
+logging.info("Loaded {} wallets".format(len(accounts)))
+
+
+class SigningHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # only serve processes running as the same user
+        credentials = self.request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        pid, uid, gid = struct.unpack('3i', credentials)
+        if uid != os.getuid():
+            logging.warning("Refused signing client pid {} uid {}".format(pid, uid))
+            self.wfile.write((json.dumps({'error': 'Not authorized'}) + "\n").encode())
+            return
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request['method'] == 'accounts':
+                    result = list(accounts)
+                elif request['method'] == 'sign':
+                    if request['address'] not in accounts:
+                        raise KeyError("No wallet loaded for {}".format(request['address']))
+                    account = accounts[request['address']]
+                    result = []
+                    for tx in request['transactions']:
+                        signed_tx = Account.sign_transaction(tx, account.key)
+                        result.append({'raw': signed_tx.rawTransaction.hex(), 'hash': signed_tx.hash.hex()})
+                    logging.info("Signed {} TX for {} (pid {})".format(len(result), account.address, pid))
+                else:
+                    raise ValueError("Unknown method {}".format(request['method']))
+            except Exception as e:
+                logging.debug(e)
+                response = {'error': str(e)}
+            else:
+                response = {'result': result}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+
+
+class SigningServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+# the socket is only readable and writable by this user
+os.umask(0o177)
+with SigningServer(socket_path, SigningHandler) as server:
+    logging.info("Signing agent listening on {}".format(socket_path))
+    try:
+        server.serve_forever()
+    finally:
+        os.remove(socket_path)
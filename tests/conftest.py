@@ -0,0 +1,9 @@
+import os
+import sys
+
+# core reads its settings from the environment and its configs from ./data at import
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(root)
+sys.path.insert(0, root)
+for key, value in (('GAS_MULTIPLIER', '2'), ('GAS_FEE_RAPID_LIMIT', '650000'), ('GAS_CACHE_SECONDS', '3'), ('SECRET', 'test')):
+    os.environ.setdefault(key, value)
@@ -0,0 +1,142 @@
+import os
+
+import pytest
+
+# deploys the executor to an in-memory chain, needs py-solc-x and eth-tester[py-evm] from requirements-dev.txt
+solcx = pytest.importorskip('solcx')
+eth_tester = pytest.importorskip('eth_tester')
+from web3 import Web3, EthereumTesterProvider
+
+solc_version = '0.8.19'
+test_contracts = '''
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.19;
+
+contract TestToken {
+    mapping(address => uint256) public balanceOf;
+    mapping(address => mapping(address => uint256)) public allowance;
+
+    function mint(address to, uint256 amount) external {
+        balanceOf[to] += amount;
+    }
+
+    function approve(address spender, uint256 amount) external returns (bool) {
+        allowance[msg.sender][spender] = amount;
+        return true;
+    }
+
+    function transfer(address to, uint256 amount) external returns (bool) {
+        return _move(msg.sender, to, amount);
+    }
+
+    function transferFrom(address from, address to, uint256 amount) external returns (bool) {
+        require(allowance[from][msg.sender] >= amount, "ALLOWANCE");
+        allowance[from][msg.sender] -= amount;
+        return _move(from, to, amount);
+    }
+
+    function _move(address from, address to, uint256 amount) internal returns (bool) {
+        require(balanceOf[from] >= amount, "BALANCE");
+        balanceOf[from] -= amount;
+        balanceOf[to] += amount;
+        return true;
+    }
+}
+
+// a zero argument mint route like the ones in routes.json, paid in one token and minting another
+contract TestRoute {
+    TestToken public input;
+    TestToken public output;
+    uint256 public cost;
+
+    constructor(TestToken input_, TestToken output_, uint256 cost_) {
+        input = input_;
+        output = output_;
+        cost = cost_;
+    }
+
+    function buy() external {
+        input.transferFrom(msg.sender, address(this), cost);
+        output.mint(msg.sender, 1 ether);
+    }
+}
+'''
+
+
+@pytest.fixture(scope='module')
+def chain():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        solcx.install_solc(solc_version)
+    except Exception as e:
+        pytest.skip("solc {} is not available: {}".format(solc_version, e))
+    compiled = solcx.compile_files(
+        [os.path.join(root, 'contracts', 'BatchExecutor.sol')],
+        output_values=['abi', 'bin'],
+        solc_version=solc_version
+    )
+    compiled.update(solcx.compile_source(test_contracts, output_values=['abi', 'bin'], solc_version=solc_version))
+    contracts = {name.split(':')[-1]: interface for name, interface in compiled.items()}
+    w3 = Web3(EthereumTesterProvider())
+    w3.eth.default_account = w3.eth.accounts[0]
+
+    def deploy(name, *args):
+        factory = w3.eth.contract(abi=contracts[name]['abi'], bytecode=contracts[name]['bin'])
+        tx_receipt = w3.eth.wait_for_transaction_receipt(factory.constructor(*args).transact())
+        return w3.eth.contract(address=tx_receipt['contractAddress'], abi=contracts[name]['abi'])
+
+    return w3, deploy
+
+
+def call_results(executor, tx_hash):
+    tx_receipt = executor.w3.eth.wait_for_transaction_receipt(tx_hash)
+    events = executor.events.CallResult().process_receipt(tx_receipt)
+    return [event['args']['success'] for event in sorted(events, key=lambda event: event['args']['index'])]
+
+
+def test_repeat_call_reports_each_call(chain):
+    w3, deploy = chain
+    owner = w3.eth.default_account
+    executor, token_in, token_out = deploy('BatchExecutor'), deploy('TestToken'), deploy('TestToken')
+    route = deploy('TestRoute', token_in.address, token_out.address, 5)
+    token_in.functions.mint(owner, 15).transact()
+    token_in.functions.approve(executor.address, 15).transact()
+    buy = route.encodeABI(fn_name='buy')
+    # only enough input for 3 of the 4 calls, the 4th fails without reverting the batch
+    tx_hash = executor.functions.repeatCall(token_in.address, 15, route.address, buy, 4, token_out.address).transact()
+    assert call_results(executor, tx_hash) == [True, True, True, False]
+    assert token_out.functions.balanceOf(owner).call() == 3 * 10 ** 18
+    assert token_in.functions.balanceOf(executor.address).call() == 0
+
+
+def test_multi_send_refunds_failed_sends(chain):
+    w3, deploy = chain
+    executor, rejecting = deploy('BatchExecutor'), deploy('TestToken')
+    recipient = w3.eth.accounts[1]
+    balance = w3.eth.get_balance(recipient)
+    # a contract without a payable fallback rejects pls
+    tx_hash = executor.functions.multiSend([recipient, rejecting.address], [100, 200]).transact({'value': 300})
+    assert call_results(executor, tx_hash) == [True, False]
+    assert w3.eth.get_balance(recipient) == balance + 100
+    assert w3.eth.get_balance(executor.address) == 0
+
+
+def test_multi_transfer_from_owner(chain):
+    w3, deploy = chain
+    owner = w3.eth.default_account
+    executor, token = deploy('BatchExecutor'), deploy('TestToken')
+    recipients = w3.eth.accounts[1:3]
+    token.functions.mint(owner, 30).transact()
+    token.functions.approve(executor.address, 30).transact()
+    # the second transfer is more than is left and fails on its own
+    tx_hash = executor.functions.multiTransfer(token.address, recipients, [10, 25]).transact()
+    assert call_results(executor, tx_hash) == [True, False]
+    assert token.functions.balanceOf(recipients[0]).call() == 10
+    assert token.functions.balanceOf(recipients[1]).call() == 0
+
+
+def test_only_owner_can_batch(chain):
+    w3, deploy = chain
+    executor = deploy('BatchExecutor')
+    with pytest.raises(Exception):
+        executor.functions.multiSend([], []).transact({'from': w3.eth.accounts[1]})
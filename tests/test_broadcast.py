@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from hexbytes import HexBytes
+
+import core
+
+
+def test_refused_top_level_checks_the_sent_levels(monkeypatch):
+    ladder = [SimpleNamespace(rawTransaction=HexBytes(bytes([level])), hash=HexBytes(bytes([level]) * 32)) for level in range(2)]
+    blocks = iter(range(100, 200, core.fee_ladder_blocks))
+    state = {'sent': [], 'landed': False}
+
+    def send_raw_transaction(raw_transaction):
+        state['sent'].append(raw_transaction)
+        if raw_transaction == ladder[-1].rawTransaction:
+            # the first level lands while the bump is refused
+            state['landed'] = True
+            raise ValueError('replacement transaction underpriced')
+        return ladder[0].hash
+
+    def get_transaction_receipt(tx_hash):
+        if not state['landed']:
+            raise Exception('not found')
+        return {'transactionHash': tx_hash}
+
+    monkeypatch.setattr(core, 'get_chain_id', lambda: 369)
+    monkeypatch.setattr(core, 'sign_fee_ladder', lambda account, tx: ladder)
+    monkeypatch.setattr(core, 'record_transaction', lambda *args: None)
+    monkeypatch.setattr(core, 'record_trade_inclusion', lambda *args: None)
+    monkeypatch.setattr(core, 'fee_ladder_poll_seconds', 0)
+    monkeypatch.setattr(core.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(core.web3.eth, 'send_raw_transaction', send_raw_transaction)
+    monkeypatch.setattr(core.web3.eth, 'get_transaction_receipt', get_transaction_receipt)
+    monkeypatch.setattr(type(core.web3.eth), 'block_number', property(lambda self: next(blocks)))
+    account = SimpleNamespace(address='0x0000000000000000000000000000000000000001')
+    tx_receipt = core.broadcast_transaction(account, {'nonce': 1, 'gasPrice': 1}, simulate=False)
+    assert tx_receipt == {'transactionHash': ladder[0].hash}
+    assert state['sent'] == [ladder[0].rawTransaction, ladder[1].rawTransaction]
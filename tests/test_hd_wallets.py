@@ -0,0 +1,14 @@
+from eth_account import Account
+
+import core
+
+Account.enable_unaudited_hdwallet_features()
+
+
+def test_derived_addresses_match_the_mnemonic(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, 'hd_wallet_folder', str(tmp_path))
+    monkeypatch.setattr(core, 'hd_wallet_state', {'mnemonic': None, 'accounts': {}})
+    words = core.generate_hd_seed('test')
+    for index in (0, 1, 7, 199):
+        expected = Account.from_mnemonic(words, account_path="m/44'/60'/0'/0/{}".format(index))
+        assert core.derive_wallet(index, 'test', False).address == expected.address
@@ -0,0 +1,45 @@
+from hexbytes import HexBytes
+
+import core
+
+wallet_address = '0x0000000000000000000000000000000000000001'
+token_address = '0x24F0154C1dCe548AdF15da2098Fdd8B8A3B8151D'
+
+
+def transfer_log(from_address, to_address, amount_wei, log_index):
+    return {
+        'address': token_address,
+        'logIndex': log_index,
+        'topics': [
+            HexBytes(core.transfer_event_topic),
+            HexBytes(bytes(12) + bytes.fromhex(from_address[2:])),
+            HexBytes(bytes(12) + bytes.fromhex(to_address[2:]))
+        ],
+        'data': HexBytes(amount_wei.to_bytes(32, 'big'))
+    }
+
+
+def test_ledger_keeps_exact_wei_without_token_lookups(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, 'ledger_file', str(tmp_path / 'ledger.db'))
+    monkeypatch.setattr(core, 'ledger_connection', None)
+    # recording runs right after a receipt arrives, so it must not fetch token info
+    monkeypatch.setattr(core, 'get_token_info', lambda *args: (_ for _ in ()).throw(AssertionError('looked up token info')))
+    amount_wei = 10 ** 30 + 1
+    for i in range(2):
+        tx_receipt = {
+            'transactionHash': HexBytes(bytes([i + 1]) * 32),
+            'blockNumber': 100 + i,
+            'status': 1,
+            'gasUsed': 21000,
+            'effectiveGasPrice': 10 ** 15,
+            'logs': [transfer_log('0x0000000000000000000000000000000000000002', wallet_address, amount_wei, 0)]
+        }
+        core.record_transaction(wallet_address, {'to': token_address, 'value': 0}, tx_receipt, 'test')
+        # a repeated receipt is not counted twice
+        core.record_transaction(wallet_address, {'to': token_address, 'value': 0}, tx_receipt, 'test')
+    assert core.get_ledger_gas_cost('test').wei == 2 * 21000 * 10 ** 15
+    monkeypatch.setattr(core, 'get_token_info', lambda *args: {'decimals': 18})
+    totals = {row['token']: row for row in core.get_ledger_totals('test')}
+    assert totals[token_address]['amount_in'].wei == 2 * amount_wei
+    assert totals[token_address]['tx_count'] == 2
+    assert totals['PLS']['gas_cost'].wei == 2 * 21000 * 10 ** 15
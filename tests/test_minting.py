@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+
+from web3.exceptions import ContractLogicError
+
+import core
+
+token_address = '0xa96BcbeD7F01de6CEEd14fC86d90F21a36dE2143'
+
+
+class RevertingMint:
+    def build_transaction(self, tx):
+        raise ContractLogicError('execution reverted')
+
+
+def test_reverting_build_fills_the_nonce_gap(monkeypatch):
+    filled = []
+    account = SimpleNamespace(address='0x0000000000000000000000000000000000000001')
+    monkeypatch.setattr(core, 'load_contract', lambda *args: SimpleNamespace(functions=SimpleNamespace(Generate=RevertingMint)))
+    monkeypatch.setattr(core, 'get_token_info', lambda *args: {'name': 'RNG', 'symbol': 'RNG', 'decimals': 18})
+    monkeypatch.setattr(core, 'get_nonce', lambda *args, **kwargs: 7)
+    monkeypatch.setattr(core, 'get_mempool_gas_prices', lambda *args: 0)
+    monkeypatch.setattr(core, 'load_mint_gas', lambda: {})
+    monkeypatch.setattr(core, 'fill_nonce_gap', lambda account, nonce, attempts: filled.append(nonce) or True)
+    # the revert comes back as a failed mint instead of escaping the batch
+    assert core.mint_tokens_concurrently(account, {token_address: 2}, max_in_flight=2) is False
+    assert sorted(filled) == [7, 8]
@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+from hexbytes import HexBytes
+
+import core
+
+pair_address = '0x0000000000000000000000000000000000000002'
+
+
+def block_hash(number, fork=0):
+    return HexBytes(bytes([fork]) + number.to_bytes(31, 'big'))
+
+
+def pair(reserve):
+    return {'token0': '0x1', 'token1': '0x2', 'reserve0': reserve, 'reserve1': reserve, 'block': 0, 'swaps': 0}
+
+
+def checkpoint(number, reserve, fork=0):
+    return {'block': number, 'block_hash': block_hash(number, fork).hex(), 'pairs': {pair_address: pair(reserve)}}
+
+
+@pytest.fixture
+def chain(tmp_path, monkeypatch):
+    chain = {'tip': 110, 'forks': {}, 'logs': []}
+
+    def get_block(identifier):
+        number = chain['tip'] if identifier == 'latest' else identifier
+        return {
+            'number': number,
+            'hash': block_hash(number, chain['forks'].get(number, 0)),
+            'parentHash': block_hash(number - 1, chain['forks'].get(number - 1, 0))
+        }
+
+    def get_logs(log_filter):
+        chain['logs'].append(log_filter)
+        return []
+
+    monkeypatch.setattr(core.web3.eth, 'get_block', get_block)
+    monkeypatch.setattr(core.web3.eth, 'get_logs', get_logs)
+    monkeypatch.setattr(core, 'pool_state_file', str(tmp_path / 'pool_state.json'))
+    monkeypatch.setattr(core, 'pool_state', {
+        'block': 110,
+        'block_hash': block_hash(110).hex(),
+        'pairs': {pair_address: pair(3)},
+        'checkpoints': [checkpoint(100, 1), checkpoint(105, 3)]
+    })
+    return chain
+
+
+def test_quiet_blocks_are_not_persisted(chain):
+    chain['tip'] = 112
+    assert core.index_pool_state([pair_address]) == 112
+    # no sync events, so only the indexed block moves
+    assert len(core.pool_state['checkpoints']) == 2
+    assert not os.path.exists(core.pool_state_file)
+
+
+def test_reorg_behind_the_tip_rolls_back(chain):
+    # block 105 was replaced while the indexed tip kept its hash
+    chain['forks'][105] = 1
+    assert core.index_pool_state([pair_address]) == 110
+    assert core.pool_state['pairs'][pair_address]['reserve0'] == 1
+    assert chain['logs'][0]['fromBlock'] == 101
+    assert [c['block'] for c in json.load(open(core.pool_state_file))['checkpoints']] == [100, 110]
@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import core
+
+
+class RpcHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.methods.append(request['method'])
+        response = json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': '0x1'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoints():
+    servers = []
+    for _ in range(2):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), RpcHandler)
+        server.methods = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.shutdown()
+
+
+def load_provider(endpoints, tmp_path, rate_limit=0.01, burst=4):
+    rate_limiter = core.RateLimiter(str(tmp_path / 'rpc_budget.db'))
+    urls = ['http://127.0.0.1:{}'.format(server.server_port) for server in endpoints]
+    return core.TransportMultiProvider(urls, rate_limiter, rate_limit, burst)
+
+
+def test_moved_reads_leave_sends_on_their_endpoint(endpoints, tmp_path):
+    provider = load_provider(endpoints, tmp_path)
+    # normal reads leave a quarter of the bucket, so the 4th read has to move
+    for _ in range(4):
+        provider.make_request('eth_call', [])
+    assert [len(server.methods) for server in endpoints] == [3, 1]
+    assert provider._current_provider_index == 0
+    provider.make_request('eth_sendRawTransaction', ['0x'])
+    assert endpoints[0].methods[-1] == 'eth_sendRawTransaction'
+
+
+@pytest.mark.parametrize('method', ['eth_getBalance', 'eth_getTransactionByHash'])
+def test_low_priority_reads_are_shed(endpoints, tmp_path, method):
+    provider = load_provider(endpoints, tmp_path)
+    for _ in range(2):
+        provider.make_request(method, [])
+    # both endpoints are down to their low priority reserve
+    provider.make_request(method, [])
+    provider.make_request(method, [])
+    with pytest.raises(core.RpcBudgetExhausted):
+        provider.make_request(method, [])
+    assert provider.rate_limiter.stats['shed'] == 1
+
+
+def test_keepalive_pings_spend_the_budget(endpoints, tmp_path):
+    provider = load_provider(endpoints, tmp_path)
+    for _ in range(3):
+        provider.ping(0)
+    # pings are low priority and stop once half the bucket is gone
+    assert len(endpoints[0].methods) == 2
+
+
+def test_importing_core_leaves_the_endpoints_alone():
+    # only the long running bots start keepalive, and the limiter is opt in
+    assert core.rpc_keepalive_thread is None
+    assert 'rpc-keepalive' not in [thread.name for thread in threading.enumerate()]
+    assert not os.path.exists('./data/cache/rpc_budget.db')
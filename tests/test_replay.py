@@ -0,0 +1,35 @@
+import pytest
+from hexbytes import HexBytes
+
+import core
+
+
+class StubProvider:
+    def __init__(self):
+        self.calls = 0
+
+    def make_request(self, method, params):
+        self.calls += 1
+        return {'jsonrpc': '2.0', 'id': self.calls, 'result': "{}:{}".format(method, self.calls)}
+
+
+def test_replay_returns_what_was_recorded_for_the_same_params(tmp_path):
+    file_path = str(tmp_path / 'session.jsonl.gz')
+    recorder = core.RecordingProvider(StubProvider(), file_path)
+    requests = [
+        ('eth_getBalance', ['0x0000000000000000000000000000000000000001', 'latest']),
+        ('eth_getBalance', ['0x0000000000000000000000000000000000000002', 'latest']),
+        ('eth_call', [{'to': '0x0000000000000000000000000000000000000003', 'data': HexBytes('0x1234')}, 'latest']),
+        ('eth_getBalance', ['0x0000000000000000000000000000000000000001', 'latest']),
+    ]
+    recorded = [recorder.make_request(method, params) for method, params in requests]
+    recorder.file.close()
+
+    replayer = core.ReplayProvider(file_path)
+    # asked out of order, each request still gets the response recorded for its own params
+    for i in (1, 2, 0, 3):
+        assert replayer.make_request(*requests[i]) == recorded[i]
+    with pytest.raises(core.ReplayMismatch):
+        replayer.make_request('eth_getBalance', ['0x0000000000000000000000000000000000000002', 'latest'])
+    with pytest.raises(core.ReplayMismatch):
+        replayer.make_request('eth_getBalance', ['0x0000000000000000000000000000000000000004', 'latest'])
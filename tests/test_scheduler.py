@@ -0,0 +1,42 @@
+import pytest
+
+import core
+
+multi_affection_address = '0x81fcd03D2100A0fE9767C0CfC68050bdc6a2969d'
+g5_address = '0x2fc636E7fDF9f3E8d61033103052079781a6e7D2'
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(core, 'scheduled_actions', {})
+    monkeypatch.setattr(core, 'get_mempool_gas_prices', lambda *args: 0)
+    monkeypatch.setattr(core, 'get_block_number', lambda: 100)
+    monkeypatch.setattr(core, 'should_wait_for_cheaper_block', lambda action, block: False)
+    monkeypatch.setattr(core, 'claim_block_gas', lambda block, gas, priority: True)
+
+
+def fail():
+    raise Exception('execution reverted')
+
+
+def test_failing_action_leaves_the_others(scheduler):
+    core.schedule_action('fail', 'transfer', fail)
+    core.schedule_action('send', 'transfer', lambda: True)
+    assert core.run_scheduled_actions() == {'fail': False, 'send': True}
+    assert core.scheduled_actions == {}
+
+
+def test_unknown_block_defers_everything(scheduler, monkeypatch):
+    monkeypatch.setattr(core, 'get_block_number', lambda: None)
+    core.schedule_action('send', 'transfer', lambda: True)
+    assert core.run_scheduled_actions() == {'send': None}
+    assert 'send' in core.scheduled_actions
+
+
+def test_convert_gas_follows_the_measured_calls(monkeypatch):
+    monkeypatch.setattr(core, 'load_mint_gas', lambda: {})
+    assert core.estimate_convert_gas(multi_affection_address, g5_address, 10) == core.scheduler_default_gas
+    monkeypatch.setattr(core, 'load_mint_gas', lambda: {multi_affection_address: {'multiBuyWithG5': {'gas_per_mint': 2000.5, 'samples': 3}}})
+    assert core.estimate_convert_gas(multi_affection_address, g5_address, 10) == 20005
+    # calls are capped at max_iterations, so bigger balances don't ask for more of one block
+    assert core.estimate_convert_gas(multi_affection_address, g5_address, 1000) == 600150
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+import pytest
+
+import core
+
+wpls_address = '0xA1077a294dDE1B09bB078844df40758a5D0f9a27'
+affection_address = '0x24F0154C1dCe548AdF15da2098Fdd8B8A3B8151D'
+pdai_address = '0x6B175474E89094C44Da98b954EedeAC495271d0F'
+
+
+class RouterFunctions:
+    def __getattr__(self, name):
+        return lambda *args: SimpleNamespace(build_transaction=lambda tx_params: {'function': name, 'args': args})
+
+
+@pytest.mark.parametrize('token_route, function', [
+    ([affection_address, pdai_address, wpls_address], 'swapExactTokensForETH'),
+    ([wpls_address, pdai_address, affection_address], 'swapExactETHForTokens'),
+    ([affection_address, wpls_address, pdai_address], 'swapExactTokensForTokens'),
+])
+def test_every_route_gets_a_minimum_output(monkeypatch, token_route, function):
+    monkeypatch.setattr(core, 'get_nonce', lambda *args: 0)
+    account = SimpleNamespace(address='0x0000000000000000000000000000000000000001')
+    amounts = [10 ** 18, 5 * 10 ** 20, 10 ** 30 + 7]
+    tx = core.build_swap_transaction(account, SimpleNamespace(functions=RouterFunctions()), token_route, amounts, 5)
+    assert tx['function'] == function
+    assert (10 ** 30 + 7) * 95 // 100 in tx['args']
+
+
+def test_slippage_is_exact_in_wei():
+    assert core.apply_slippage(10 ** 30 + 7, 5) == (10 ** 30 + 7) * 95 // 100
+    assert core.apply_slippage(1000, 0.5) == 995
+
+
+def test_router_contracts_are_reused():
+    assert core.load_router_contract('PulseX_v2') is core.load_router_contract('PulseX_v2')
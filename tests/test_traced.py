@@ -0,0 +1,24 @@
+import core
+
+# each trade trace stage and the function that should report it
+traced_stages = {
+    'approve_token_spending': 'approve',
+    'broadcast_transaction': 'broadcast',
+    'estimate_swap_result': 'estimate',
+    'find_best_swap': 'estimate',
+    'sample_exchange_rate': 'sample',
+    'sample_exchange_rates': 'sample',
+    'sign_fee_ladder': 'sign',
+    'simulate_transaction': 'simulate',
+    'swap_tokens': 'swap',
+}
+
+
+def test_stage_functions_are_traced():
+    for name, stage in traced_stages.items():
+        assert getattr(getattr(core, name), 'trace_stage', None) == stage, name
+
+
+def test_untraced_functions_stay_untraced():
+    for name in ('find_arbitrage_cycles', 'run_scheduled_actions', 'should_wait_for_cheaper_block'):
+        assert not hasattr(getattr(core, name), 'trace_stage'), name
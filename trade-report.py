@@ -0,0 +1,39 @@
+from core import *
+
+# show help
+if len(sys.argv) > 1 and 'help' == sys.argv[1].lower():
+    print("Reports stage latency percentiles and blocks behind at inclusion from traced trades.")
+    print("Run the buyer/seller with TRADE_TRACE=true to collect traces.\n")
+    print("Example Usage:")
+    command = "python {}".format(sys.argv[0])
+    examples = ['', '--hours 24']
+    for e in examples:
+        print("{} {}".format(command, e))
+    sys.exit()
+
+# only include recent traces
+since = None
+if "--hours" in sys.argv:
+    try:
+        since = time.time() - float(sys.argv[sys.argv.index("--hours") + 1]) * 3600
+    except (IndexError, ValueError):
+        print("Invalid number of hours")
+        sys.exit()
+
+report = get_trade_trace_report(since=since)
+print("\nTraced trades: {}\n".format(report['traces']))
+print("{:<22} {:>6} {:>10} {:>10} {:>10}".format('Stage (seconds)', 'Count', 'p50', 'p90', 'p99'))
+rows = sorted(report['stages'].items()) + [('sample to inclusion', report['sample_to_inclusion'])]
+for stage, stats in rows:
+    print("{:<22} {:>6} {:>10} {:>10} {:>10}".format(
+        stage,
+        stats['count'],
+        *["{:.3f}".format(stats[p]) if stats[p] is not None else '-' for p in ('p50', 'p90', 'p99')]
+    ))
+stats = report['blocks_behind']
+print("\n{:<22} {:>6} {:>10} {:>10} {:>10}".format(
+    'Blocks behind',
+    stats['count'],
+    *[stats[p] if stats[p] is not None else '-' for p in ('p50', 'p90', 'p99')]
+))
+print()
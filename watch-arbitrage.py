@@ -0,0 +1,56 @@
+from core import *
+
+# show help
+if len(sys.argv) > 1 and 'help' == sys.argv[1].lower():
+    print("Watches every pool between the known tokens plus the mint routes in routes.json for profitable cycles each block.")
+    print("Cycles are only logged, sizing and executing them is left to the bots.\n")
+    print("Example Usage:")
+    command = "python {}".format(sys.argv[0])
+    examples = ['', '--min-profit 1.5', '--routers PulseX_v1,PulseX_v2']
+    for e in examples:
+        print("{} {}".format(command, e))
+    sys.exit()
+
+# smallest profit worth logging, in percent after pool fees
+min_profit_percent = arbitrage_min_profit_percent
+if "--min-profit" in sys.argv:
+    try:
+        min_profit_percent = float(sys.argv[sys.argv.index("--min-profit") + 1])
+    except (IndexError, ValueError):
+        print("Invalid minimum profit")
+        sys.exit()
+
+# routers whose pools become edges
+router_names = None
+if "--routers" in sys.argv:
+    try:
+        router_names = sys.argv[sys.argv.index("--routers") + 1].split(',')
+    except IndexError:
+        print("Invalid routers")
+        sys.exit()
+
+set_logging('arbitrage', 'INFO')
+start_rpc_keepalive()
+
+# set config variables
+loop_delay = 1
+
+last_block = None
+while True:
+    # only rebuild the graph once per block
+    if (block_number := web3.eth.block_number) == last_block:
+        time.sleep(loop_delay)
+        continue
+    last_block = block_number
+
+    started = time.time()
+    edges = get_arbitrage_edges(router_names)
+    cycles = find_arbitrage_cycles(edges, min_profit_percent)
+    logging.info("Block {}: {} edges, {} cycles in {:.1f} ms".format(block_number, len(edges), len(cycles), (time.time() - started) * 1000))
+    for cycle in cycles:
+        logging.info("{:.3f}% {} via {}".format(
+            cycle['profit_percent'],
+            " -> ".join(get_token_info(token_address)['symbol'] for token_address in cycle['tokens']),
+            ", ".join(cycle['sources'])
+        ))
+    log_end_loop(0)